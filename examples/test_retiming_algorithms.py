@@ -0,0 +1,113 @@
+# This file is part of nodalhdl (https://github.com/Gralerfics/nodalhdl), distributed under the GPLv3. See LICENSE.
+
+from nodalhdl.timing.retiming import SimpleCircuit, ExtendedCircuit
+
+from typing import List, Tuple
+
+import io
+import random
+import itertools
+import contextlib
+
+import networkx as nx
+
+
+def random_circuit(seed: int, n: int = 6) -> Tuple[List[float], List[Tuple[int, int, int]]]:
+    """
+        A small synchronous circuit with float delays, vertex 0 as the host. Every vertex is on a cycle through the host.
+    """
+    rnd = random.Random(seed)
+    d = [0.0] + [round(rnd.uniform(0.5, 8.0), 3) for _ in range(n - 1)]
+    edges = [(rnd.randrange(0, v), v, rnd.randint(0, 1)) for v in range(1, n)] # spanning tree from the host
+    for _ in range(n):
+        a, b = rnd.randrange(n), rnd.randrange(n)
+        if a != b:
+            edges.append((a, b, rnd.randint(0, 2) if a < b else rnd.randint(1, 2))) # back edges carry registers
+    edges += [(v, 0, 1) for v in range(1, n)]
+    edges = [(a, b, max(w, 1) if a == 0 else w) for a, b, w in edges]
+    return d, edges
+
+
+def simple_circuit(d: List[float], edges: List[Tuple[int, int, int]]) -> SimpleCircuit:
+    G = SimpleCircuit()
+    G.add_vertices(d)
+    G.add_edges(edges)
+    return G
+
+
+def extended_circuit(d: List[float], edges: List[Tuple[int, int, int]]) -> ExtendedCircuit:
+    """
+        The same circuit in the extended model, one internal edge (from all the inputs to all the outputs) per vertex.
+    """
+    G = ExtendedCircuit()
+    es = [G.add_external_edge(a, b, w) for a, b, w in edges]
+    for v, d_v in enumerate(d):
+        G.add_internal_edge(v, d_v, [e for e, (_, b, _) in zip(es, edges) if b == v], [e for e, (a, _, _) in zip(es, edges) if a == v])
+    return G
+
+
+def legal_retimings(G: SimpleCircuit):
+    """
+        All the legal r with r(0) = 0, -W(0, v) <= r(v) <= W(v, 0).
+    """
+    H = nx.MultiDiGraph()
+    H.add_weighted_edges_from(zip(G.u.tolist(), G.v.tolist(), G.w.tolist()))
+    lo, hi = nx.single_source_dijkstra_path_length(H, 0), nx.single_source_dijkstra_path_length(H.reverse(), 0)
+    for r in itertools.product(*[range(-lo[v], hi[v] + 1) for v in range(1, G.n)]):
+        r = [0] + list(r)
+        if all(G.w[e] + r[G.v[e]] - r[G.u[e]] >= 0 for e in range(G.m)):
+            yield r
+
+
+if __name__ == "__main__":
+    for seed in range(40):
+        d, edges = random_circuit(seed)
+        G = simple_circuit(d, edges)
+        nets = [[e for e, (a, _, _) in enumerate(edges) if a == u] for u in range(1, len(d))]
+        nets = [net for net in nets if len(net) > 1]
+        G.add_nets(nets)
+        
+        rs = list(legal_retimings(G))
+        Phis = [G.compute_retimed_clock_period(r) for r in rs]
+        Phi_G, Phi_opt = G.compute_clock_period()[0], min(Phis)
+        
+        with contextlib.redirect_stdout(io.StringIO()): # [INFO] logs
+            # candidate periods
+            Ds = G.compute_Ds()
+            assert Ds == G.compute_Ds(mode = "all_pairs") == G.compute_Ds(workers = 2), seed
+            
+            # clock-period minimization, the WD method against brute force, the others against it
+            Phi_wd, r_wd = G.minimize_clock_period()
+            assert abs(Phi_wd - Phi_opt) < 1e-9 and abs(G.compute_retimed_clock_period(r_wd) - Phi_wd) < 1e-9, (seed, Phi_wd, Phi_opt)
+            Phi_bisect, _ = G.minimize_clock_period(method = "bisect", tolerance = 1e-3)
+            assert Phi_wd - 1e-9 <= Phi_bisect <= Phi_wd + 1e-3, (seed, Phi_bisect, Phi_wd)
+            Phi_partitioned, _ = G.minimize_clock_period(partitions = 2)
+            assert abs(Phi_partitioned - Phi_wd) < 1e-9, (seed, Phi_partitioned, Phi_wd)
+            Phi_capped, r_capped = G.minimize_clock_period(memory_limit = 32)
+            assert Phi_capped >= Phi_wd - 1e-9 and abs(G.compute_retimed_clock_period(r_capped) - Phi_capped) < 1e-9, seed
+            
+            # FEAS, on clusters and warm started
+            for c in Ds:
+                r = G.solve_retiming(c)
+                assert (r is not False) == (c >= Phi_opt - 1e-9), (seed, c)
+                assert G.solve_retiming_partitioned(c, 2) == r, (seed, c)
+                if r is not False:
+                    assert G.solve_retiming(c, r_init = r_wd if c >= Phi_wd else None) is not False, (seed, c)
+            
+            # minimum-area retiming, against brute force
+            for c in (Phi_wd, Phi_G):
+                r = G.minimize_registers(c)
+                count_opt = min(G.count_registers(r_, nets) for r_, Phi in zip(rs, Phis) if Phi <= c + 1e-9)
+                assert G.compute_retimed_clock_period(r) <= c + 1e-9 and G.count_registers(r, nets) == count_opt, (seed, c)
+            
+            # the extended model with one internal edge per vertex (paths are not chained through the host, a port vertex), against brute force
+            H = extended_circuit(d, edges)
+            assert abs(H.compute_clock_period()[0] - Phi_G) < 1e-9, seed # no zero-weight edge on the host initially
+            Phi_ext_opt = min(H.compute_retimed_clock_period(r) for r in rs)
+            for method in ("feas", "midc"):
+                Phi_ext, r_ext = H.minimize_clock_period(method = method)
+                assert abs(Phi_ext - Phi_ext_opt) < 1e-9 and abs(H.compute_retimed_clock_period(r_ext) - Phi_ext) < 1e-9, (seed, method, Phi_ext, Phi_ext_opt)
+        
+        print(f"seed {seed}: Phi(G) = {Phi_G}, Phi_opt = {Phi_opt}, {len(rs)} legal retiming(s) checked")
+    
+    print("all checks passed")
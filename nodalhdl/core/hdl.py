@@ -325,22 +325,30 @@ class HDLFileModel:
         
         self.signals[name] = t
     
+    @staticmethod
+    def register_names(name: str, level: int) -> Tuple[str, str]:
+        """
+            return next_signal_name and reg_signal_name of the `level`-th register of chain `name`.
+        """
+        return (f"reg_next_{level}_{name}", f"reg_{level}_{name}")
+    
     def add_register(self, name: str, t: SignalType, latency: int = 1) -> Tuple[str, str]: # , initial_values: Union[str, List[str]] = None)
         """
             return next_signal_name and reg_signal_name.
+            the `level`-th register of the chain can be tapped by register_names(name, level).
             notice that the naming rules here influence STA.
         """
         for level in range(latency):
-            reg_next_name, reg_name = f"reg_next_{level}_{name}", f"reg_{level}_{name}"
+            reg_next_name, reg_name = HDLFileModel.register_names(name, level)
             self.registers.add((reg_next_name, reg_name, t))
             
             self.add_signal(reg_next_name, t)
             self.add_signal(reg_name, t)
             
             if level >= 1:
-                self.add_assignment(f"reg_next_{level}_{name}", f"reg_{level - 1}_{name}")
+                self.add_assignment(reg_next_name, HDLFileModel.register_names(name, level - 1)[1])
         
-        return (f"reg_next_0_{name}", f"reg_{latency - 1}_{name}")
+        return (HDLFileModel.register_names(name, 0)[0], HDLFileModel.register_names(name, latency - 1)[1])
     
     def add_assignment(self, target: str, value: str):
         self.assignments.append((target, value))
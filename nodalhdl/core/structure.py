@@ -1025,38 +1025,22 @@ class Structure:
         for net, ((driver_wire_name, driver_latency), loads_info) in net_wires.items():
             if driver_wire_name is not None: # driver -> loads
                 """
-                    driver_wire_name (= center_wire_name)
+                    driver_wire_name --> reg_next_0_d_{name} | ... | reg_{l-1}_d_{name}, l = max{driver_latency + load_latency}
+                    the registers of a net are shared by its loads, each load taps the chain at its own latency.
                 """
-                center_wire_name = driver_wire_name
-                
-                # driver
-                if driver_latency > 0:
-                    """
-                        driver_wire_name --> reg_next_0_d_{name} | ... | reg_{l-1}_d_{name} (= center_wire_name)
-                    """
-                    reg_next_name, reg_name = model.add_register("d_" + driver_wire_name, net.get_runtime(runtime_id).signal_type, latency = driver_latency)
+                chain_latency = max([driver_latency + load_latency for _, load_latency in loads_info], default = 0)
+                chain_name = "d_" + driver_wire_name
+                if chain_latency > 0:
+                    reg_next_name, _ = model.add_register(chain_name, net.get_runtime(runtime_id).signal_type, latency = chain_latency)
                     model.add_assignment(reg_next_name, driver_wire_name)
-                    center_wire_name = reg_name
                 
                 # loads
-                for idx, (load_wire_name, load_latency) in enumerate(loads_info):
-                    """
-                        center_wire_name (= end_wire_name)
-                    """
-                    end_wire_name = center_wire_name
-                    
-                    if load_latency > 0:
-                        """
-                            center_wire_name --> reg_next_0_l_{name} | ... | reg_{l-1}_l_{name} (= end_wire_name)
-                        """
-                        reg_next_name, reg_name = model.add_register(f"l_" + load_wire_name, net.get_runtime(runtime_id).signal_type, latency = load_latency)
-                        model.add_assignment(reg_next_name, center_wire_name)
-                        end_wire_name = reg_name
-                    
+                for load_wire_name, load_latency in loads_info:
                     """
-                        end_wire_name --> load_wire_name
+                        reg_{t-1}_d_{name} (or driver_wire_name if t = 0) --> load_wire_name, t = driver_latency + load_latency
                     """
-                    model.add_assignment(load_wire_name, end_wire_name)
+                    tap = driver_latency + load_latency
+                    model.add_assignment(load_wire_name, HDLFileModel.register_names(chain_name, tap - 1)[1] if tap > 0 else driver_wire_name)
             else: # no driver, n/c
                 pass
         
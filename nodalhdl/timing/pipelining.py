@@ -5,7 +5,16 @@ from ..core.structure import *
 from ..core.hdl import *
 from .retiming import *
 
-from typing import Union, Dict, List, Tuple
+import os
+import io
+import csv
+import json
+import contextlib
+import concurrent.futures
+
+from typing import Union, Dict, List, Tuple, Set
+
+import numpy as np
 
 
 class RetimingException(Exception): pass
@@ -15,51 +24,63 @@ class PipeliningException(Exception): pass
 def to_extended_circuit(s: Structure, root_runtime_id: RuntimeId):
     """
         The structure `s` should be flattened and timing-analysed.
-        TODO 1. 有问题 (to be repaired); 2. 简化节点
+        Vertex 0 is for the ports, 1 ~ N for the substructures, and every driver -> load pair is an external edge.
+        Internal edges come from the port-to-port entries of timing_info, (in-port, out-port) -> delay;
+            a substructure with only ('_simple_in', '_simple_out') (or no timing info) gets one bundle from all its inputs to all its outputs.
+        Return G, `vertices_map` (substructure -> vertex) and `external_edges_map` (load -> external edge ID).
+        TODO 简化节点
     """
     if not s.is_flattened:
         raise RetimingException("Only flattened and timing-analysed structures can be converted")
     
     G = ExtendedCircuit()
     
-    # external edges
+    # vertices, 0 for ports and 1 ~ N for substructures
+    vertices_map: Dict[str, int] = {subs_inst_name: idx + 1 for idx, subs_inst_name in enumerate(s.substructures.keys())}
+    G.get_vertex(len(vertices_map))
+    
+    # external edges, each driver -> load pair
     external_edges_map: Dict[Node, int] = {}
-    external_edge_idx = 0
     for net in s.get_nets():
         if not net.has_driver:
             continue
-        driver_latency = net.driver().latency
+        driver = net.driver()
+        u = vertices_map[driver.of_structure_inst_name] if driver.of_structure_inst_name is not None else 0
         
-        # each driver -> load pair indicates an external edge
         for load in net.get_loads():
-            external_edges_map[load] = external_edge_idx
-            G.set_external_edge_weight(external_edge_idx, driver_latency + load.latency)
-            external_edge_idx += 1
-
+            v = vertices_map[load.of_structure_inst_name] if load.of_structure_inst_name is not None else 0
+            external_edges_map[load] = G.add_external_edge(u, v, driver.latency + load.latency)
+    
+    def _e_outs(driver: Node) -> List[int]:
+        return [external_edges_map[load] for load in driver.located_net.get_loads()]
+    
     # vertex 0 (ports-equivalent-vertex)
-    e_ins_0 = [external_edges_map[po] for _, po in s.ports_inside_flipped.nodes(filter = "out", flipped = True)] # e_ins_0 are all the output ports' edges
-    e_outs_0 = [external_edges_map[pi_load] for _, pi in s.ports_inside_flipped.nodes(filter = "in", flipped = True) for pi_load in pi.located_net.get_loads()] # e_outs_0 ...
+    e_ins_0 = [external_edges_map[po] for _, po in s.ports_inside_flipped.nodes(filter = "out", flipped = True) if po in external_edges_map] # e_ins_0 are all the output ports' edges
+    e_outs_0 = [e for _, pi in s.ports_inside_flipped.nodes(filter = "in", flipped = True) for e in _e_outs(pi)] # e_outs_0 ...
     G.add_internal_edge(0, 0.0, e_ins_0, e_outs_0)
-
-    # vertices
-    vertices_map: Dict[str, int] = {}
+    
+    # internal edges of the substructures
     internal_edges_list: List[Tuple[int, float, List[int], List[int]]] = []
-    for idx, (subs_inst_name, subs) in enumerate(s.substructures.items()):
-        vertex_idx = idx + 1 # 1 ~ N
-        vertices_map[subs_inst_name] = vertex_idx
+    for subs_inst_name, subs in s.substructures.items():
+        vertex_idx = vertices_map[subs_inst_name]
         
         subs_ports_outside = s.get_subs_ports_outside(subs_inst_name)
         in_ports = subs_ports_outside.nodes(filter = "in")
         out_ports = subs_ports_outside.nodes(filter = "out")
         
         timing_info = subs.get_runtime(root_runtime_id.next(subs_inst_name)).timing_info
-        for pi_layered_name, pi in in_ports:
-            for po_layered_name, po in out_ports:
-                delay = timing_info.get((pi_layered_name, po_layered_name), None)
-                if delay is not None:
-                    e_ins = [external_edges_map[pi]]
-                    e_outs = [external_edges_map[po_load] for po_load in po.located_net.get_loads()]
-                    internal_edges_list.append((vertex_idx, delay, e_ins, e_outs))
+        timing_info = timing_info if timing_info is not None else {}
+        if any(key != ("_simple_in", "_simple_out") for key in timing_info.keys()): # port-to-port
+            for pi_layered_name, pi in in_ports:
+                for po_layered_name, po in out_ports:
+                    delay = timing_info.get((pi_layered_name, po_layered_name), None)
+                    if delay is not None:
+                        e_ins = [external_edges_map[pi]] if pi in external_edges_map else []
+                        internal_edges_list.append((vertex_idx, delay, e_ins, _e_outs(po)))
+        else:
+            e_ins = [external_edges_map[pi] for _, pi in in_ports if pi in external_edges_map]
+            e_outs = [e for _, po in out_ports for e in _e_outs(po)]
+            internal_edges_list.append((vertex_idx, timing_info.get(("_simple_in", "_simple_out"), 0.0), e_ins, e_outs))
     
     G.add_internal_edges(internal_edges_list)
     
@@ -69,85 +90,240 @@ def to_extended_circuit(s: Structure, root_runtime_id: RuntimeId):
 def to_simple_circuit(s: Structure, root_runtime_id: RuntimeId, ignore_delay_lower_than: float = 1e-2):
     """
         The structure `s` should be flattened and timing-analysed.
-        TODO 简化节点, 忽略延迟小于 ignore_delay_lower_than 的节点 (除了 v0), 涉及到此处 (to_simple_circuit) 建图 G, retiming() 中 apply 等过程.
+        Substructures with delay lower than `ignore_delay_lower_than` (wiring such as slicing, concatenation, shifting by constants, ...)
+            are coalesced into their neighbour (except v0): into the only successor if all the out-edges go to it with zero latency,
+            otherwise into the only predecessor if all the in-edges come from it with zero latency. Use None to keep all the vertices.
+            A coalesced group gets r as a whole, i.e. no register between its members, and its delay is the longest path inside it.
+        Loads of a net become edges of a net in G (see SimpleCircuit/add_nets), so that its registers are counted once.
+        Return G, `vertices_map` (substructure -> vertex, shared by a group) and `edges_map` (load -> edge ID in G, w/o the ones inside a group).
     """
     if not s.is_flattened:
         raise RetimingException("Only flattened can be converted")
     
-    G = SimpleCircuit()
-    
-    # vertices
-    G.add_vertex(0.0) # vertex 0
-    
-    vertices_map: Dict[str, int] = {}
-    for idx, (subs_inst_name, subs) in enumerate(s.substructures.items()):
+    # vertices, 0 for ports and 1 ~ N for substructures
+    delays: List[float] = [0.0]
+    names: List[str] = []
+    for subs_inst_name, subs in s.substructures.items():
         timing_info = subs.get_runtime(root_runtime_id.next(subs_inst_name)).timing_info
-        delay = timing_info.get(('_simple_in', '_simple_out'), 0.0) if timing_info is not None else 0.0
-        
-        # if delay > ignore_delay_lower_than:
-        vertex_idx = idx + 1 # 1 ~ N
-        vertices_map[subs_inst_name] = vertex_idx
-        G.add_vertex(delay)
-        # else:
-        #     pass # TODO
-    
-    # edges
-    edges_map: Dict[Node, int] = {}
-    edge_idx = 0
-    edges_dict: Dict[Tuple[int, int], int] = {}
-    edges_list: List[Tuple[int, int, int]] = []
+        delays.append(timing_info.get(('_simple_in', '_simple_out'), 0.0) if timing_info is not None else 0.0)
+        names.append(subs_inst_name)
+    indices = {name: idx + 1 for idx, name in enumerate(names)}
     
-    for net in s.get_nets():
-        if not net.has_driver:
-            continue
+    # edges between them
+    loads_list: List[Tuple[Node, int, int, int, int]] = [] # (load, u, v, latency, net index)
+    for net_idx, net in enumerate([net for net in s.get_nets() if net.has_driver]):
         driver = net.driver()
         
         # each driver -> load pair indicates an edge
         for load in net.get_loads():
-            edges_map[load] = edge_idx
-            
-            u = vertices_map[driver.of_structure_inst_name] if driver.of_structure_inst_name is not None else 0
-            v = vertices_map[load.of_structure_inst_name] if load.of_structure_inst_name is not None else 0
-            edges_dict[(u, v)] = driver.latency + load.latency # ignore repeated edge
-            
-            edge_idx += 1
+            u = indices[driver.of_structure_inst_name] if driver.of_structure_inst_name is not None else 0
+            v = indices[load.of_structure_inst_name] if load.of_structure_inst_name is not None else 0
+            loads_list.append((load, u, v, driver.latency + load.latency, net_idx))
+    
+    # coalescing (union-find)
+    parent = list(range(len(delays)))
+    def find(x: int):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+    
+    if ignore_delay_lower_than is not None:
+        outs: Dict[int, Dict[int, Set[int]]] = {} # u -> v -> latencies
+        ins: Dict[int, Dict[int, Set[int]]] = {}
+        for _, u, v, latency, _ in loads_list:
+            outs.setdefault(u, {}).setdefault(v, set()).add(latency)
+            ins.setdefault(v, {}).setdefault(u, set()).add(latency)
+        
+        for x in range(1, len(delays)):
+            if delays[x] >= ignore_delay_lower_than:
+                continue
+            x_outs, x_ins = outs.get(x, {}), ins.get(x, {})
+            if len(x_outs) == 1 and list(x_outs.values()) == [{0}] and list(x_outs.keys())[0] not in (0, x):
+                y = list(x_outs.keys())[0]
+            elif len(x_ins) == 1 and list(x_ins.values()) == [{0}] and list(x_ins.keys())[0] not in (0, x):
+                y = list(x_ins.keys())[0]
+            else:
+                continue
+            root_x, root_y = find(x), find(y)
+            if root_x != root_y:
+                parent[root_x] = root_y
+    
+    groups: Dict[int, int] = {} # root -> vertex in G
+    for x in range(len(delays)):
+        groups.setdefault(find(x), len(groups))
+    group_of = [groups[find(x)] for x in range(len(delays))]
+    
+    # delay of a group: longest path through its members over the zero-latency edges inside it (G_0 is a DAG)
+    inner = set((u, v) for _, u, v, latency, _ in loads_list if latency == 0 and u != v and group_of[u] == group_of[v])
+    inner_succs: Dict[int, List[int]] = {}
+    in_degrees = [0] * len(delays)
+    for u, v in inner:
+        inner_succs.setdefault(u, []).append(v)
+        in_degrees[v] += 1
+    arrival = list(delays)
+    frontier = [x for x in range(len(delays)) if in_degrees[x] == 0]
+    while frontier:
+        x = frontier.pop()
+        for y in inner_succs.get(x, []):
+            arrival[y] = max(arrival[y], arrival[x] + delays[y])
+            in_degrees[y] -= 1
+            if in_degrees[y] == 0:
+                frontier.append(y)
+    group_delays = [0.0] * len(groups)
+    for x in range(len(delays)):
+        group_delays[group_of[x]] = max(group_delays[group_of[x]], arrival[x])
+    
+    # G, one edge per (u, v, latency) of a net, so that the registers of a net are counted as max{w_r(e)} of its edges
+    G = SimpleCircuit()
+    G.add_vertices(group_delays)
+    
+    vertices_map: Dict[str, int] = {name: group_of[idx] for name, idx in indices.items()}
     
-    edges_list = [(u, v, l) for (u, v), l in edges_dict.items()]
-    G.add_edges(edges_list)
+    edges_idx: Dict[Tuple[int, int, int, int], int] = {}
+    edges_map: Dict[Node, int] = {} # load -> edge ID in G
+    nets: Dict[int, List[int]] = {}
+    for load, u, v, latency, net_idx in loads_list:
+        g_u, g_v = group_of[u], group_of[v]
+        if g_u == g_v and latency == 0:
+            continue # inside a group
+        key = (g_u, g_v, latency, net_idx)
+        if key not in edges_idx:
+            edges_idx[key] = len(edges_idx)
+            nets.setdefault(net_idx, []).append(edges_idx[key])
+        edges_map[load] = edges_idx[key]
+    G.add_edges([(g_u, g_v, latency) for (g_u, g_v, latency, _) in edges_idx.keys()])
+    G.add_nets(nets.values())
+    
+    if len(groups) < len(delays):
+        print(f"[INFO] coalesced {len(delays) - len(groups)} vertex(es) with delay lower than {ignore_delay_lower_than}") # TODO
     
     return G, vertices_map, edges_map
 
 
-def retiming(s: Structure, root_runtime_id: RuntimeId, period: Union[float, str] = "min", model = "simple"):
+def _solve_extended(G: ExtendedCircuit, period: Union[float, str], memory_limit: int, workers: int):
+    if period == "min":
+        Phi_Gr, r = G.minimize_clock_period(external_port_vertices = [0], memory_limit = memory_limit, workers = workers)
+        return r, Phi_Gr
+    return G.solve_retiming(period, external_port_vertices = [0]), period
+
+
+def _solve_simple(G: SimpleCircuit, period: Union[float, str], memory_limit: int, workers: int, method: str, tolerance: float, minimize_registers: bool, partitions: int):
+    if period == "min":
+        Phi_Gr, r = G.minimize_clock_period(memory_limit = memory_limit, workers = workers, method = method, tolerance = tolerance, partitions = partitions)
+    else: # number
+        Phi_Gr = period
+        r = G.solve_retiming(period) if partitions is None else G.solve_retiming_partitioned(period, partitions, workers = workers)
+        if not r:
+            return False, period
+    
+    if minimize_registers:
+        registers = G.count_registers(r)
+        r = G.minimize_registers(Phi_Gr)
+        print(f"[INFO] registers: {registers} -> {G.count_registers(r)}") # TODO
+    return r, Phi_Gr
+
+
+def _simple_problem(period: Union[float, str], method: str, tolerance: float, minimize_registers: bool, memory_limit: int = None) -> Dict:
+    """
+        Parameters of retiming() on the simple model which the result depends on, for RetimingCache.key().
+        `memory_limit` matters to WD, whose candidate periods are rounded up under a cap.
+    """
+    problem = {"model": "simple", "period": period, "minimize_registers": minimize_registers}
+    if period == "min":
+        problem.update({"method": method, "tolerance": tolerance if method == "bisect" else None, "memory_limit": memory_limit if method == "wd" else None})
+    return problem
+
+
+def _cached_retiming(G: Union[SimpleCircuit, ExtendedCircuit], entry: Dict):
+    """
+        (r, Phi_Gr) of a cache entry, or None if it does not fit G (i.e. illegal r, or Phi(G_r) not achieved).
+    """
+    r, Phi_Gr = entry["r"], entry["Phi_Gr"]
+    if r is None:
+        return False, Phi_Gr
+    
+    if isinstance(G, SimpleCircuit):
+        n, u, v, w = G.n, G.u, G.v, G.w
+    else:
+        index = G._index()
+        n, u, v, w = len(G.V), index["u"], index["v"], index["w"]
+    if len(r) != n:
+        return None
+    r_arr = np.asarray(r, dtype = np.int64)
+    if n > 0 and (w + r_arr[v] - r_arr[u]).min(initial = 0) < 0:
+        return None
+    if G.compute_retimed_clock_period(r) > Phi_Gr + G.EPSILON:
+        return None
+    return r, Phi_Gr
+
+
+def retiming(s: Structure, root_runtime_id: RuntimeId, period: Union[float, str] = "min", model = "simple", memory_limit: int = None, workers: int = None, method: str = "wd", tolerance: float = 1e-2, minimize_registers: bool = False, partitions: int = None, cache: RetimingCache = None):
     """
         Retiming.
         The structure `s` should be flattened and timing-analysed.
         `period`: target clock period (ns), use "min" to perform clock-period-minimization.
+        `memory_limit`: memory cap (bytes) for the candidate periods collected by the WD algorithm, None as unlimited.
+        `workers`: number of processes running the WD algorithm, None to run in the current process.
+        `method`, `tolerance`: (simple model) clock-period-minimization method, "wd" (exact) or "bisect" (WD-free, within `tolerance` ns),
+            see SimpleCircuit/minimize_clock_period.
+        `minimize_registers`: (simple model) then minimize the number of registers under the obtained period,
+            counting the registers shared by a net once, see SimpleCircuit/minimize_registers.
+        `partitions`: (simple model) number of clusters solved in parallel (by `workers` processes) before the global FEAS,
+            for large structures, see SimpleCircuit/solve_retiming_partitioned. The result is the same.
+        `cache`: RetimingCache consulted before solving, keyed by the circuit and the parameters above which affect the result.
+            The circuit is still built from `s` to apply r.
     """
     if model == "extended":
+        if minimize_registers:
+            raise RetimingException("Register minimization is only supported by the simple model")
+        if partitions is not None:
+            raise RetimingException("Partitioned retiming is only supported by the simple model")
+        
         G, V_map, E_map = to_extended_circuit(s, root_runtime_id)
         
-        if period == "min":
-            Phi_Gr, r = G.minimize_clock_period(external_port_vertices = [0])
-        else: # number
-            r = G.solve_retiming(period, external_port_vertices = [0])
-            if not r:
-                return False
+        print(f"[INFO] |V| = {len(G.V)}, |E| = {len(G.E)}, |F| = {len(G.F)}") # TODO
+        
+        problem = {"model": model, "period": period, "memory_limit": memory_limit if period == "min" else None}
+        solve = lambda: _solve_extended(G, period, memory_limit, workers)
     elif model == "simple":
         G, V_map, E_map = to_simple_circuit(s, root_runtime_id)
 
-        print(f"[INFO] |V| = {len(G.V)}, |E| = {len(G.E)}") # TODO
-
-        if period == "min":
-            Phi_Gr, r = G.minimize_clock_period()
-        else: # number
-            r = G.solve_retiming(period)
-            if not r:
-                return False
+        print(f"[INFO] |V| = {G.n}, |E| = {G.m}") # TODO
+        
+        problem = _simple_problem(period, method, tolerance, minimize_registers, memory_limit)
+        solve = lambda: _solve_simple(G, period, memory_limit, workers, method, tolerance, minimize_registers, partitions)
     else:
         raise RetimingException(f"Unsupported circuit model type \'{model}\'")
     
-    # apply the retiming to the structure
+    # solve, or fetch from the cache
+    result = None
+    if cache is not None:
+        key = RetimingCache.key(G, **problem)
+        entry = cache.get(key)
+        result = _cached_retiming(G, entry) if entry is not None else None
+        if result is not None:
+            print(f"[INFO] retiming result found in cache (key: {key})") # TODO
+    if result is None:
+        result = solve()
+        if cache is not None:
+            cache.put(key, *result)
+    
+    r, Phi_Gr = result
+    if not r:
+        return False
+    if model == "simple" and not minimize_registers:
+        print(f"[INFO] registers: {G.count_registers(r)}") # TODO
+    
+    _apply_retiming(s, V_map, E_map, r)
+    
+    return Phi_Gr
+
+
+def _apply_retiming(s: Structure, V_map: Dict[str, int], E_map: Dict[Node, int], r: List[int]):
+    """
+        Apply the retiming r (of the circuit converted from `s`, with `V_map` and `E_map`) to the structure.
+    """
     for load in E_map.keys():
         driver = load.located_net.driver() # [NOTICE] 理论上 E_map 中 load 都有对应的 driver
         u = V_map[driver.of_structure_inst_name] if driver.of_structure_inst_name is not None else 0
@@ -156,13 +332,12 @@ def retiming(s: Structure, root_runtime_id: RuntimeId, period: Union[float, str]
     
     for net in s.get_nets():
         net.transform_to_best_distribution()
-    
-    return Phi_Gr if period == "min" else period
 
 
-def pipelining(s: Structure, root_runtime_id: RuntimeId, levels: int = None, period: float = None, model = "simple"):
+def pipelining(s: Structure, root_runtime_id: RuntimeId, levels: int = None, period: float = None, model = "simple", memory_limit: int = None, workers: int = None, method: str = "wd", tolerance: float = 1e-2, minimize_registers: bool = False, partitions: int = None, cache: RetimingCache = None):
     """
         Pipelining.
+        `memory_limit`, `workers`, `method`, `tolerance`, `minimize_registers`, `partitions`, `cache`: see retiming().
     """
     if s.is_sequential:
         raise PipeliningException("Only combinational structures can be pipelined")
@@ -172,7 +347,7 @@ def pipelining(s: Structure, root_runtime_id: RuntimeId, levels: int = None, per
         for _, pi in s.ports_inside_flipped.nodes(filter = "in", flipped = True):
             pi.set_latency(levels)
         
-        if retiming(s, root_runtime_id, period = period, model = model): # success
+        if retiming(s, root_runtime_id, period = period, model = model, workers = workers, minimize_registers = minimize_registers, partitions = partitions, cache = cache): # success
             return levels, period
         else: # failed
             for _, pi in s.ports_inside_flipped.nodes(filter = "in", flipped = True):
@@ -185,22 +360,158 @@ def pipelining(s: Structure, root_runtime_id: RuntimeId, levels: int = None, per
             pi.set_latency(levels)
         
         # retiming
-        Phi_Gr = retiming(s, root_runtime_id, period = "min", model = model)
+        Phi_Gr = retiming(s, root_runtime_id, period = "min", model = model, memory_limit = memory_limit, workers = workers, method = method, tolerance = tolerance, minimize_registers = minimize_registers, partitions = partitions, cache = cache)
     
     elif period is not None:
-        # estimate? binary search?
-        pass # TODO
+        if model != "simple":
+            raise PipeliningException("Searching the number of levels is only supported by the simple model")
         
-        # levels = ...
+        # levels, with no register on the input ports
+        G, V_map, E_map = to_simple_circuit(s, root_runtime_id)
         
-        # retiming
-        # Phi_Gr = retiming(s, root_runtime_id, period = TODO, model = model)
+        print(f"[INFO] |V| = {G.n}, |E| = {G.m}") # TODO
+        
+        result = None
+        if cache is not None:
+            key = RetimingCache.key(G, model = model, period = period, levels = "min", minimize_registers = minimize_registers)
+            entry = cache.get(key)
+            if entry is not None and isinstance(entry.get("levels"), int):
+                G.w[G.u == 0] += entry["levels"]
+                result = _cached_retiming(G, entry)
+                G.w[G.u == 0] -= entry["levels"]
+                if result is not None:
+                    levels = entry["levels"]
+                    print(f"[INFO] pipelining result found in cache (key: {key})") # TODO
+        if result is None:
+            res = G.minimize_input_levels(period, workers = workers, partitions = partitions)
+            if res is False:
+                return False
+            levels, r = res
+            
+            # the edges from vertex 0 carry the input registers from now on
+            G.w[G.u == 0] += levels
+            if minimize_registers:
+                registers = G.count_registers(r)
+                r = G.minimize_registers(period)
+                print(f"[INFO] registers: {registers} -> {G.count_registers(r)}") # TODO
+            else:
+                print(f"[INFO] registers: {G.count_registers(r)}") # TODO
+            result = (r, G.compute_retimed_clock_period(r))
+            if cache is not None:
+                cache.put(key, *result, levels = levels)
+        
+        r, Phi_Gr = result
+        
+        # add registers on all the input ports, then retiming
+        for _, pi in s.ports_inside_flipped.nodes(filter = "in", flipped = True):
+            pi.set_latency(levels)
+        _apply_retiming(s, V_map, E_map, r)
     
     else:
         raise Exception("At least one of `levels` and `period` should be provided")
     
     return levels, Phi_Gr
 
+
+_sweep_worker_state: Dict = {}
+
+
+def _sweep_worker_init(G: SimpleCircuit, options: Dict):
+    _sweep_worker_state["G"], _sweep_worker_state["options"] = G, options
+
+
+def _sweep_worker_run(levels: int):
+    """
+        Minimize the clock period of G with `levels` registers on the edges from vertex 0, return (levels, Phi_Gr, registers, r).
+    """
+    G_L: SimpleCircuit = _sweep_worker_state["G"].deepcopy()
+    options = _sweep_worker_state["options"]
+    G_L.w[G_L.u == 0] += levels
+    
+    with contextlib.redirect_stdout(io.StringIO()) if options["quiet"] else contextlib.nullcontext():
+        r, Phi_Gr = _solve_simple(G_L, "min", None, None, options["method"], options["tolerance"], options["minimize_registers"], None)
+    return levels, Phi_Gr, G_L.count_registers(r), r
+
+
+def pipelining_sweep(s: Structure, root_runtime_id: RuntimeId, levels: List[int], workers: int = None, method: str = "wd", tolerance: float = 1e-2, minimize_registers: bool = False, cache: RetimingCache = None, output_path: str = None) -> List[Dict]:
+    """
+        Explore the tradeoff between the number of levels, the clock period and the number of registers.
+        The structure `s` should be flattened and timing-analysed, and is not modified: the circuit is built once (w/o registers on the input ports),
+            then for each number in `levels`, a copy with the input registers is retimed to the minimum clock period.
+        `workers`: number of processes sharing `levels`, None to run in the current process.
+        `method`, `tolerance`, `minimize_registers`: see retiming().
+        `cache`: RetimingCache, consulted and filled with the same keys as retiming(), so that a following pipelining(s, ..., levels = ...)
+            with the chosen number (and the same options) is a cache hit.
+        `output_path`: also write the table to it, as CSV if it ends with ".csv" or JSON otherwise.
+        Return the table, rows {"levels", "period", "registers", "pareto"} sorted by levels,
+            "pareto" is True if no other row is at least as good in all the three and better in one.
+    """
+    if s.is_sequential:
+        raise PipeliningException("Only combinational structures can be pipelined")
+    
+    G, _, _ = to_simple_circuit(s, root_runtime_id)
+    levels = sorted(set(levels))
+    if levels and levels[0] < 1 and G._topological_order(with_host = True) is None:
+        raise PipeliningException("At least one level is needed, the input ports are on zero-weight cycle(s)")
+    
+    print(f"[INFO] |V| = {G.n}, |E| = {G.m}, sweeping {len(levels)} level count(s)") # TODO
+    
+    # cached ones
+    rows: Dict[int, Dict] = {}
+    keys: Dict[int, str] = {}
+    if cache is not None:
+        problem = _simple_problem("min", method, tolerance, minimize_registers)
+        for L in levels:
+            G.w[G.u == 0] += L
+            keys[L] = RetimingCache.key(G, **problem)
+            entry = cache.get(keys[L])
+            result = _cached_retiming(G, entry) if entry is not None else None
+            if result is not None:
+                rows[L] = {"levels": L, "period": result[1], "registers": G.count_registers(result[0])}
+            G.w[G.u == 0] -= L
+    
+    # the others
+    options = {"method": method, "tolerance": tolerance, "minimize_registers": minimize_registers, "quiet": workers is not None and workers > 1}
+    remained = [L for L in levels if L not in rows]
+    if workers is not None and workers > 1 and len(remained) > 1:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers = min(workers, len(remained)), initializer = _sweep_worker_init, initargs = (G, options))
+        results = executor.map(_sweep_worker_run, remained)
+    else:
+        executor = None
+        _sweep_worker_init(G, options)
+        results = map(_sweep_worker_run, remained)
+    try:
+        for L, Phi_Gr, registers, r in results:
+            print(f"[INFO] {L} level(s): period {Phi_Gr}, {registers} register(s)") # TODO
+            rows[L] = {"levels": L, "period": Phi_Gr, "registers": registers}
+            if cache is not None:
+                cache.put(keys[L], r, Phi_Gr)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    
+    # Pareto frontier, minimizing all of (levels, period, registers)
+    table = [rows[L] for L in levels]
+    for row in table:
+        row["pareto"] = not any(
+            other["levels"] <= row["levels"] and other["period"] <= row["period"] and other["registers"] <= row["registers"] and
+            (other["levels"], other["period"], other["registers"]) != (row["levels"], row["period"], row["registers"])
+            for other in table
+        )
+    
+    if output_path is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok = True)
+        with open(output_path, "w", newline = "") as f:
+            if output_path.endswith(".csv"):
+                writer = csv.DictWriter(f, fieldnames = ["levels", "period", "registers", "pareto"])
+                writer.writeheader()
+                writer.writerows(table)
+            else:
+                json.dump(table, f, indent = 4)
+    
+    return table
+
+
 def insert_ready_valid_chain(model: HDLFileModel, levels: int, prev_ready_name = "in_ready", prev_valid_name = "in_valid", post_ready_name = "out_ready", post_valid_name = "out_valid", valid_regs_name = "valid_chain"):
     # if in_valid_name is not None and out_valid_name is not None: ... # TODO 四个信号名可以为 None, 为 None 时不构建相关功能
     
@@ -1,132 +1,477 @@
 # This file is part of nodalhdl (https://github.com/Gralerfics/nodalhdl), distributed under the GPLv3. See LICENSE.
 
+import os
 import math
+import json
 import heapq
 import time
+import hashlib
+import collections
+import contextlib
+import concurrent.futures
 
-from typing import List, Set, Tuple
+from multiprocessing import shared_memory
+from typing import List, Dict, Set, Tuple
 from dataclasses import dataclass, field
 
 import networkx as nx
+import numpy as np
+
+
+def _multi_source_dijkstra(ptr: List[int], targets: List[int], weights: List[float], sources: List[int], offsets: List[float]) -> List[float]:
+    """
+        Dijkstra on a CSR graph (edges of x: targets[ptr[x]:ptr[x + 1]], weighted weights[...]), starting from sources[i] at offsets[i].
+        Return dist[], math.inf for unreachable vertices.
+    """
+    dist = [math.inf] * (len(ptr) - 1)
+    Q = []
+    for source, offset in zip(sources, offsets):
+        if offset < dist[source]:
+            dist[source] = offset
+            Q.append((offset, source))
+    heapq.heapify(Q)
+    while Q:
+        dist_x, x = heapq.heappop(Q)
+        if dist_x > dist[x]:
+            continue
+        for k in range(ptr[x], ptr[x + 1]):
+            y, dist_y = targets[k], dist_x + weights[k]
+            if dist_y < dist[y]:
+                dist[y] = dist_y
+                heapq.heappush(Q, (dist_y, y))
+    return dist
+
+
+def _single_source_dijkstra(ptr: List[int], targets: List[int], weights: List[float], source: int) -> List[float]:
+    return _multi_source_dijkstra(ptr, targets, weights, [source], [0.0])
+
+
+def _johnson_reweight(ptr: np.ndarray, targets: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+        Johnson's reweighting of a CSR graph with negative weights (but no negative cycle) for Dijkstra.
+        Potentials h[] are shortest paths from a virtual source (i.e. h = 0 initially) by queue-based Bellman-Ford (SPFA).
+        Return the non-negative weights[k] + h[x] - h[y] of the edges x -> y, and h[]. Then dist(x, y) = dist'(x, y) - h[x] + h[y].
+    """
+    n = len(ptr) - 1
+    ptr_l, targets_l, weights_l = ptr.tolist(), targets.tolist(), weights.tolist()
+    h = [0.0] * n
+    hops = [0] * n # number of edges on the current shortest path to v
+    queue = collections.deque(range(n))
+    in_queue = [True] * n
+    while queue:
+        x = queue.popleft()
+        in_queue[x] = False
+        h_x, hops_x = h[x], hops[x] + 1
+        for k in range(ptr_l[x], ptr_l[x + 1]):
+            y = targets_l[k]
+            if h[y] > h_x + weights_l[k]:
+                h[y] = h_x + weights_l[k]
+                hops[y] = hops_x
+                if hops_x >= n:
+                    raise Exception("Circle(s) exist(s)") # negative cycle
+                if not in_queue[y]:
+                    in_queue[y] = True
+                    queue.append(y)
+    
+    h = np.array(h, dtype = np.float64)
+    sources = np.repeat(np.arange(n), np.diff(ptr))
+    return np.maximum(weights + h[sources] - h[targets], 0.0), h # clip floating-point error
+
+
+class _PeriodCandidates:
+    """
+        Sorted and de-duplicated candidate clock periods (D values), collected source by source.
+        `D_max`: Phi(G), which r = 0 achieves, so larger values are clipped down to it.
+        `memory_limit`: max bytes for the stored values (None as unlimited), at least 2 values are kept. When exceeded, the values are
+            rounded up onto a grid (then clipped to D_max), whose resolution is doubled until they fit. Rounding up keeps every candidate
+            an upper bound of an exact D value, so the binary search stays correct and the result is at most one resolution step above
+            the optimum (D_min is kept exact).
+    """
+    def __init__(self, D_min: float, D_max: float, memory_limit: int = None):
+        self.D_min: float = D_min
+        self.D_max: float = max(D_max, D_min)
+        self.values: np.ndarray = np.array([D_min], dtype = np.float64)
+        self.pending: List[np.ndarray] = []
+        self.pending_count: int = 0
+        self.max_count: int = max(memory_limit // (2 * 8), 2) if memory_limit is not None else None # values and pending together, D_min and D_max
+        self.resolution: float = 0.0
+    
+    def _round_up(self, values: np.ndarray) -> np.ndarray:
+        res = np.ceil(values / self.resolution) * self.resolution
+        res = np.where(res < values, res + self.resolution, res) # floating-point error
+        return np.minimum(res, self.D_max)
+    
+    def add(self, values: np.ndarray):
+        if values.size == 0:
+            return
+        values = np.round(values, 9) # near-equal ones from different summation orders
+        values = np.unique(self._round_up(values) if self.resolution > 0 else np.minimum(values, self.D_max))
+        self.pending.append(values)
+        self.pending_count += values.size
+        if self.pending_count >= (self.max_count if self.max_count is not None else max(self.values.size, 1 << 16)):
+            self.flush()
+    
+    def flush(self):
+        if self.pending:
+            self.values = np.unique(np.concatenate([self.values] + self.pending))
+            self.pending.clear()
+            self.pending_count = 0
+        
+        while self.max_count is not None and self.values.size > self.max_count:
+            if self.resolution == 0:
+                self.resolution = (self.values[-1] - self.values[0]) / self.max_count
+            else:
+                self.resolution *= 2
+            self.values = np.union1d(self._round_up(self.values), [self.D_min]) # the lower bound is kept exact
+    
+    def result(self) -> List[float]:
+        self.flush()
+        return self.values.tolist()
+
+
+def _min_weighted_edges(us: np.ndarray, vs: np.ndarray, weights: np.ndarray) -> List[Tuple[int, int, float]]:
+    """
+        Edges (u, v, weight) with parallel ones reduced to the lightest, for networkx.DiGraph which keeps only one edge per (u, v).
+    """
+    order = np.lexsort((weights, vs, us))
+    us, vs, weights = us[order], vs[order], weights[order]
+    first = np.ones(us.size, dtype = bool)
+    first[1:] = (us[1:] != us[:-1]) | (vs[1:] != vs[:-1])
+    return list(zip(us[first].tolist(), vs[first].tolist(), weights[first].tolist()))
+
+
+_WD_LIST_KEYS = ("ptr", "targets", "weights") # arrays accessed element by element, kept as lists
+
+
+def _simple_wd_candidates(graph: Dict, sources: List[int], memory_limit: int = None) -> np.ndarray:
+    """
+        Candidate D values of SimpleCircuit contributed by the given sources, see SimpleCircuit/compute_Ds.
+    """
+    C, d, h = graph["C"], graph["d"], graph["h"]
+    Ds = _PeriodCandidates(graph["D_min"], graph["D_max"], memory_limit = memory_limit)
+    for u in sources:
+        dist = np.array(_single_source_dijkstra(graph["ptr"], graph["targets"], graph["weights"], u))
+        dist[u] = math.inf # u == v skipped
+        
+        vs = np.flatnonzero(dist < math.inf)
+        dist = dist[vs] - h[u] + h[vs] # W_uv * C - (D_uv - d(v)), 0 <= D_uv - d(v) < C
+        W_uv = np.ceil((dist - 0.5) / C)
+        D_uv = d[vs] + W_uv * C - dist
+        Ds.add(D_uv[D_uv >= graph["D_min"]])
+    Ds.flush()
+    return Ds.values
+
+
+def _extended_wd_candidates(graph: Dict, sources: List[int], memory_limit: int = None) -> np.ndarray:
+    """
+        Candidate D values of ExtendedCircuit contributed by the given source vertices, see ExtendedCircuit/compute_Ds.
+        For each source vertex u, one Dijkstra starts from all e_a in e_outs(u) at once, each at -d_a(e_a), i.e. as if entered through
+            its slowest internal edge, so that dist(e_b) = W * C - D orders (W, -D) over all the e_a together.
+    """
+    C, D_min, owner, d_a, h = graph["C"], graph["D_min"], graph["owner"], graph["d_a"], graph["h"]
+    e_outs_ptr, e_outs = graph["e_outs_ptr"], graph["e_outs"]
+    Ds = _PeriodCandidates(D_min, graph["D_max"], memory_limit = memory_limit)
+    for u in sources:
+        e_as = e_outs[e_outs_ptr[u]:e_outs_ptr[u + 1]]
+        e_as = e_as[d_a[e_as] > -math.inf] # not driven by any internal edge
+        if e_as.size == 0:
+            continue
+        dist = np.array(_multi_source_dijkstra(graph["ptr"], graph["targets"], graph["weights"], e_as.tolist(), (-h[e_as] - d_a[e_as]).tolist()))
+        
+        e_bs = np.flatnonzero((dist < math.inf) & (owner != u))
+        dist = dist[e_bs] + h[e_bs] # W * C - D, 0 <= D < C
+        W = np.ceil((dist - 0.5) / C)
+        D = W * C - dist
+        keep = D > D_min
+        vs, W, D = owner[e_bs[keep]], W[keep], D[keep]
+        
+        # (min W, then max D) for each v
+        order = np.lexsort((-D, W, vs))
+        vs, D = vs[order], D[order]
+        first = np.ones(vs.size, dtype = bool)
+        first[1:] = vs[1:] != vs[:-1]
+        Ds.add(D[first])
+    Ds.flush()
+    return Ds.values
+
+
+_wd_worker_state: Dict = {}
+
+
+def _wd_worker_init(kind: str, scalars: Dict, shared_specs: Dict[str, Tuple[str, tuple, str]], memory_limit: int):
+    """
+        Initializer of WD worker processes, copy the graph arrays out of shared memory once per process.
+    """
+    graph = dict(scalars)
+    for key, (shm_name, shape, dtype) in shared_specs.items():
+        shm = shared_memory.SharedMemory(name = shm_name)
+        arr = np.ndarray(shape, dtype = dtype, buffer = shm.buf)
+        graph[key] = arr.tolist() if key in _WD_LIST_KEYS else arr.copy()
+        del arr
+        shm.close()
+    _wd_worker_state.update(kind = kind, graph = graph, memory_limit = memory_limit)
+
+
+def _wd_worker_run(sources: List[int]) -> np.ndarray:
+    kernel = _simple_wd_candidates if _wd_worker_state["kind"] == "simple" else _extended_wd_candidates
+    return kernel(_wd_worker_state["graph"], sources, _wd_worker_state["memory_limit"])
+
+
+def _run_wd(kind: str, scalars: Dict, arrays: Dict[str, np.ndarray], n_sources: int, memory_limit: int = None, workers: int = None) -> List[float]:
+    """
+        Run the WD kernel of `kind` ("simple" or "extended") over sources 0 ~ n_sources - 1 and collect the candidate periods.
+        `workers`: number of worker processes, None or 1 to run in the current process.
+            The graph arrays are shared through multiprocessing.shared_memory, sources are split into chunks,
+            and each task only sends back its local (de-duplicated) candidate set.
+    """
+    kernel = _simple_wd_candidates if kind == "simple" else _extended_wd_candidates
+    Ds = _PeriodCandidates(scalars["D_min"], scalars["D_max"], memory_limit = memory_limit)
+    
+    if workers is None or workers <= 1 or n_sources <= 1:
+        graph = {**scalars, **{key: arr.tolist() if key in _WD_LIST_KEYS else arr for key, arr in arrays.items()}}
+        Ds.add(kernel(graph, range(n_sources), memory_limit))
+        return Ds.result()
+    
+    shms: List[shared_memory.SharedMemory] = []
+    try:
+        shared_specs = {}
+        for key, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            shm = shared_memory.SharedMemory(create = True, size = max(arr.nbytes, 1))
+            shms.append(shm)
+            np.ndarray(arr.shape, dtype = arr.dtype, buffer = shm.buf)[...] = arr
+            shared_specs[key] = (shm.name, arr.shape, arr.dtype.str)
+        
+        chunk_size = max(1, math.ceil(n_sources / (workers * 8))) # several chunks per worker for load balancing
+        chunks = [list(range(start, min(start + chunk_size, n_sources))) for start in range(0, n_sources, chunk_size)]
+        with concurrent.futures.ProcessPoolExecutor(max_workers = workers, initializer = _wd_worker_init, initargs = (kind, scalars, shared_specs, memory_limit)) as executor:
+            for future in concurrent.futures.as_completed([executor.submit(_wd_worker_run, chunk) for chunk in chunks]):
+                Ds.add(future.result())
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+    
+    return Ds.result()
+
+
+def _local_feas(G: 'SimpleCircuit', c: float, r_init: List[int]) -> List[int]:
+    """
+        r after FEAS on c in the induced subcircuit G from r_init, feasible or not, see SimpleCircuit/_partitioned_start.
+        r_init is shifted to min{r} = 0 during FEAS, which only depends on the differences besides its infeasibility check.
+    """
+    r_init = np.asarray(r_init, dtype = np.int64)
+    base = int(r_init.min()) if r_init.size > 0 else 0
+    _, _, r = G._feas(c, r_init - base, prefix_above = -math.inf) # r_prefix is the final r, as no vertex has delta(v) <= -inf
+    return (np.asarray(r) + base).tolist()
+
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    """
+        splitmix64 finalizer, elementwise on uint64.
+    """
+    with np.errstate(over = "ignore"):
+        x = x.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+_partition_worker_state: Dict = {}
+
+
+def _partition_worker_init(subcircuits: List['SimpleCircuit']):
+    _partition_worker_state["subcircuits"] = subcircuits
+
+
+def _partition_worker_run(k: int, c: float, r_init: List[int]) -> List[int]:
+    return _local_feas(_partition_worker_state["subcircuits"][k], c, r_init)
 
 
 class MIDCSolver:
     """
         Mixed-Integer Difference Constraints Solver.
             x_j - x_i <= a_ij for some x_i are reals and some are integers.
+        Constraints are stored in flat arrays (u[], v[], a[]) and grouped into CSR adjacency once, reused by later solving.
+        Parametric: a_ij = a_const + a_dc / c, where c is set by set_parameter(), so that one system serves all the probes of a search on c.
+            The reweighting of the last feasible solving is kept to warm start the next one on a tighter system (smaller c, with all a_dc <= 0).
         Ref: C.E. Leiserson and James B. Saxe, A mixed-integer programming problem which is efficiently solvable, Journal of Algorithms, Vol. 9, 1988, pp. 114-128
     """
-    @dataclass
-    class EdgeInfo:
-        next: int # next edge ID, -1 as EndOfList
-        next_r: int # next real edge ID
-        u: int # start vertex ID
-        v: int # end vertex ID
-        a: float # a_ij
-        b: float = 0 # b_ij
-    
     def __init__(self, n: int = 0, k: int = 0):
         self.n: int = n # number of vertices, i.e. |V|
         self.k: int = k # number of integer vertices, i.e. |V_I|
         
         self.is_int: List[bool] = [True] * k + [False] * (n - k) # is_int[v]
-        self.head: List[int] = [-1] * n # head[v]
-        self.head_r: List[int] = [-1] * n # head_r[v], only record real edges
         
         self.m: int = 0 # number of edges
-        self.edges: List[MIDCSolver.EdgeInfo] = []
+        self.u: List[int] = [] # u[e], start vertex ID, i.e. x_i
+        self.v: List[int] = [] # v[e], end vertex ID, i.e. x_j
+        self.a_const: List[float] = [] # a_const[e]
+        self.a_dc: List[float] = [] # a_dc[e], coefficient of 1 / c
         
-        self.E_R: List[int] = [] # real edge IDs (real edge: (u, v), v is real vertex, i.e. not is_int[v])
-        self.E_I: List[int] = [] # integer edge IDs
+        self.c: float = 1.0 # the parameter
+        self._structure: Dict = None # CSR of real/int edges, None as outdated
+        self._warm: Tuple[float, List[float]] = None # (c, r[]) of the last feasible solving
     
     def add_real_variable(self):
         self.n += 1
         self.is_int.append(False)
-        self.head.append(-1)
-        self.head_r.append(-1)
+        self._structure, self._warm = None, None
     
     def add_int_variable(self):
         self.n += 1
         self.k += 1
         self.is_int.append(True)
-        self.head.append(-1)
-        self.head_r.append(-1)
+        self._structure, self._warm = None, None
+    
+    def add_constraint(self, x_j: int, x_i: int, a_ij: float, a_dc: float = 0.0):
+        """
+            x_j - x_i <= a_ij + a_dc / c.
+            i.e. an edge weighted a_ij + a_dc / c from x_i to x_j in the constraint graph.
+        """
+        self.u.append(x_i)
+        self.v.append(x_j)
+        self.a_const.append(a_ij)
+        self.a_dc.append(a_dc)
+        self.m += 1
+        self._structure, self._warm = None, None
+    
+    def set_parameter(self, c: float):
+        self.c = c
+    
+    @staticmethod
+    def _csr(n: int, u: np.ndarray, edges: np.ndarray):
+        """
+            CSR over the given edge IDs grouped by start vertex, return (ptr, edges) as lists.
+        """
+        order = edges[np.argsort(u[edges], kind = "stable")]
+        ptr = np.zeros(n + 1, dtype = np.int64)
+        np.cumsum(np.bincount(u[edges], minlength = n), out = ptr[1:])
+        return ptr.tolist(), order
     
-    def add_constraint(self, x_j: int, x_i: int, a_ij: float):
+    def _get_structure(self):
+        if self._structure is None:
+            u = np.asarray(self.u, dtype = np.int64)
+            v = np.asarray(self.v, dtype = np.int64)
+            is_int_v = np.asarray(self.is_int, dtype = bool)[v]
+            ptr_r, order_r = MIDCSolver._csr(self.n, u, np.flatnonzero(~is_int_v)) # real edge: (u, v), v is real vertex
+            ptr_i, order_i = MIDCSolver._csr(self.n, u, np.flatnonzero(is_int_v))
+            self._structure = {
+                "u": u, "v": v,
+                "a_const": np.asarray(self.a_const, dtype = np.float64),
+                "a_dc": np.asarray(self.a_dc, dtype = np.float64),
+                "monotone": all(a_dc <= 0 for a_dc in self.a_dc), # tighter for smaller c
+                "ptr_r": ptr_r, "order_r": order_r, "targets_r": v[order_r].tolist(),
+                "ptr_i": ptr_i, "order_i": order_i, "targets_i": v[order_i].tolist()
+            }
+        return self._structure
+    
+    def _reweight(self, ptr: List[int], targets: List[int], weights: List[float], r_init: List[float] = None):
         """
-            x_j - x_i <= a_ij.
-            i.e. an edge weighted a_ij from x_i to x_j in the constraint graph.
+            T1 ~ T6, shortest paths over real edges from a virtual source (i.e. r = 0 initially) by queue-based Bellman-Ford (SPFA).
+            Every edge on such a path ends on a real vertex, so a simple one has at most n - k edges;
+                any longer one contains a negative cycle, which is reported (as False) as soon as it is found.
+            `r_init`: any start between the result and 0 leads to the same result, e.g. the one of a looser system.
         """
-        self.edges.append(MIDCSolver.EdgeInfo(
-            next = self.head[x_i],
-            next_r = self.head_r[x_i], # invalid for int edges
-            u = x_i,
-            v = x_j,
-            a = a_ij
-        ))
-        self.head[x_i] = self.m
+        r = [0] * self.n if r_init is None else list(r_init)
+        hops = [0] * self.n # number of edges on the current shortest path to v
+        queue = collections.deque(v for v in range(self.n) if ptr[v] < ptr[v + 1])
+        in_queue = [False] * self.n
+        for v in queue:
+            in_queue[v] = True
+        limit = self.n - self.k
         
-        if self.is_int[x_j]:
-            self.E_I.append(self.m)
-        else:
-            self.E_R.append(self.m)
-            self.head_r[x_i] = self.m
+        while queue:
+            i = queue.popleft()
+            in_queue[i] = False
+            r_i, hops_i = r[i], hops[i] + 1
+            for idx in range(ptr[i], ptr[i + 1]):
+                j = targets[idx]
+                if r[j] > r_i + weights[idx]:
+                    r[j] = r_i + weights[idx]
+                    hops[j] = hops_i
+                    if hops_i > limit:
+                        return False # T6
+                    if not in_queue[j]:
+                        in_queue[j] = True
+                        queue.append(j)
         
-        self.m += 1
+        return r
     
-    def solve(self):
+    def _m_algorithm(self, structure: Dict, b_r: List[float], b_i: List[float]):
         """
-            Algorithm T in Section 5.
-            Return False for infeasible, or x[].
+            T9 ~ T24, relax int edges and real edges (Dijkstra) alternately on the reweighted system.
+            Return False for infeasible, or y[].
         """
-        # reweighting
-        r = [0] * self.n # T1
-        for _ in range(self.n - self.k): # T2, Bellman-Ford
-            for e_r in self.E_R: # T3
-                i, j, a_ij = self.edges[e_r].u, self.edges[e_r].v, self.edges[e_r].a
-                r[j] = min(r[j], r[i] + a_ij) # T4
-        for e_r in self.E_R: # T5, validate
-            i, j, a_ij = self.edges[e_r].u, self.edges[e_r].v, self.edges[e_r].a
-            if r[j] > r[i] + a_ij:
-                return False # T6
-        for edge in self.edges: # T7
-            i, j, a_ij = edge.u, edge.v, edge.a
-            edge.b = a_ij + r[i] - r[j] # T8
+        ptr_r, targets_r = structure["ptr_r"], structure["targets_r"]
+        ptr_i, targets_i = structure["ptr_i"], structure["targets_i"]
         
-        # framework of M algorithm
-        y = [0] * self.n # T9
+        y = [0] * self.n # T9, satisfies all real edges since b_ij >= 0 on them
+        dirty = range(self.n) # vertices whose int edges are to be relaxed
         for _ in range(self.k): # T10
             # relax int edges
-            for e_i in self.E_I: # T12
-                i, j, b_ij = self.edges[e_i].u, self.edges[e_i].v, self.edges[e_i].b
-                y[j] = min(y[j], math.floor(y[i] + b_ij)) # T13
+            changed = set()
+            for i in dirty: # T12
+                y_i = y[i]
+                for idx in range(ptr_i[i], ptr_i[i + 1]):
+                    j = targets_i[idx]
+                    y_j = math.floor(y_i + b_i[idx])
+                    if y[j] > y_j: # T13
+                        y[j] = y_j
+                        changed.add(j)
+            if not changed:
+                return y # fixpoint, all constraints hold
             
-            # relax real edges (Dijkstra)
-            Q = [(y[v], v) for v in range(self.n)]
-            heapq.heapify(Q) # T14
-            visited = set()
+            # relax real edges (Dijkstra), only the decreased vertices can violate them
+            Q = [(y[t], t) for t in changed] # T14
+            heapq.heapify(Q)
             while Q: # T15
-                _, i = heapq.heappop(Q) # T17, T18
-                if i in visited:
+                y_i, i = heapq.heappop(Q) # T17, T18
+                if y_i > y[i]:
                     continue
-                visited.add(i)
-                
-                e_r = self.head_r[i]
-                while e_r != -1: # T19
-                    j, b_ij = self.edges[e_r].v, self.edges[e_r].b
-                    if y[j] > y[i] + b_ij:
-                        y[j] = y[i] + b_ij # T20
+                for idx in range(ptr_r[i], ptr_r[i + 1]): # T19
+                    j = targets_r[idx]
+                    if y[j] > y_i + b_r[idx]:
+                        y[j] = y_i + b_r[idx] # T20
+                        changed.add(j)
                         heapq.heappush(Q, (y[j], j))
-                    e_r = self.edges[e_r].next_r
+            dirty = changed
         
         # validate (only int edges needed)
-        for e_i in self.E_I: # T23
-            i, j, b_ij = self.edges[e_i].u, self.edges[e_i].v, self.edges[e_i].b
-            if y[j] > y[i] + b_ij:
-                return False # T24
+        for i in dirty: # T23
+            for idx in range(ptr_i[i], ptr_i[i + 1]):
+                if y[targets_i[idx]] > y[i] + b_i[idx]:
+                    return False # T24
+        return y
+    
+    def solve(self):
+        """
+            Algorithm T in Section 5.
+            Return False for infeasible, or x[].
+            The reweighting is the greatest solution below 0 of the real edges, hence the one of a looser system is a valid start.
+        """
+        structure = self._get_structure()
+        u, v = structure["u"], structure["v"]
+        a = structure["a_const"] + structure["a_dc"] / self.c
+        warm = self._warm if self._warm is not None and structure["monotone"] and self.c <= self._warm[0] else None
+        
+        # reweighting
+        order_r, order_i = structure["order_r"], structure["order_i"]
+        r = self._reweight(structure["ptr_r"], structure["targets_r"], a[order_r].tolist(), r_init = warm[1] if warm else None) # T1 ~ T6
+        if r is False:
+            return False
+        r_arr = np.asarray(r, dtype = np.float64)
+        b = a + r_arr[u] - r_arr[v] # T7, T8
+        b_r, b_i = b[order_r].tolist(), b[order_i].tolist()
+        
+        # framework of M algorithm
+        y = self._m_algorithm(structure, b_r, b_i)
+        if y is False:
+            return False
         
         # recover the results
-        x = [y[v] + r[v] for v in range(self.n)]
+        x = [y[t] + r[t] for t in range(self.n)]
+        self._warm = (self.c, r)
         return x
 
 
@@ -135,11 +480,14 @@ class ExtendedCircuit:
         Extended circuit model allowing nonuniform functional element delays.
         Record (u, v, w) for edges and (v, d, e_ins[], e_outs[]) for internal edges, that is enough to build constraints and build H<E, F, wd>;
         Record (fs[]) for vertices, for WD computation.
+        The records are flattened into arrays (see _index()) on demand and cached until G is modified.
+        Paths through the external port vertices (`external_port_vertices`, i.e. internal edges f with v(f) in them) are not considered
+            combinational, consistently in the constraints, WD and CP.
         Support:
-            1. Solve retiming r for a given clock period c by solving an MILP problem.
+            1. Solve retiming r for a given clock period c by (Extended) FEAS algorithm or by solving an MILP problem.
             2. Apply retiming r on G to obtain G_r.
             3. Run (Extended) WD algorithm to obtain D(u, v).
-            4. TODO Run (Extended) CP algorithm to obtain Phi(G).
+            4. Run (Extended) CP algorithm to obtain Phi(G).
             5. Combine (3.), binary search and (1.) to solve clock-period-minimization problem.
     """
     EPSILON = 1e-5
@@ -167,27 +515,51 @@ class ExtendedCircuit:
         self.V: List[ExtendedCircuit.FunctionalElement] = []
         self.E: List[ExtendedCircuit.ExternalEdge] = []
         self.F: List[ExtendedCircuit.InternalEdge] = []
+        
+        self._index_cache: Dict[str, np.ndarray] = None # see _index(), None as outdated
+        self._constraints: Tuple[tuple, MIDCSolver] = None # (external_port_vertices, parametric MIDC system), None as outdated
+    
+    def _invalidate(self):
+        self._index_cache = None
+        self._constraints = None
     
     """ Getters """
     def get_vertex(self, v: int):
         if v > len(self.V) - 1:
             self.V.extend([ExtendedCircuit.FunctionalElement() for _ in range(v + 1 - len(self.V))])
+            self._invalidate()
         return self.V[v]
     
     def get_external_edge(self, e: int):
         if e > len(self.E) - 1:
             self.E.extend([ExtendedCircuit.ExternalEdge() for _ in range(e + 1 - len(self.E))])
+            self._invalidate()
         return self.E[e]
     
     def get_internal_edge(self, f: int):
         return self.F[f]
     
     def get_vertex_e_outs(self, v: int):
-        return set([e_out for f in self.get_vertex(v).fs for e_out in self.get_internal_edge(f).e_outs])
+        index = self._index()
+        return set(index["e_outs"][index["e_outs_ptr"][v]:index["e_outs_ptr"][v + 1]].tolist())
     
     """ Constructing """
+    def add_external_edge(self, u: int, v: int, w: int) -> int:
+        """
+            Add an edge u --e-> v explicitly, so that it is complete even if it is not connected to any internal edge.
+        """
+        e = len(self.E)
+        e_obj = self.get_external_edge(e)
+        e_obj.u, e_obj.v, e_obj.w = u, v, w
+        self.get_vertex(max(u, v))
+        return e
+    
+    def add_external_edges(self, info: List[Tuple]) -> List[int]:
+        return [self.add_external_edge(*entry) for entry in info]
+    
     def set_external_edge_weight(self, e: int, w: int):
         self.get_external_edge(e).w = w
+        self._invalidate()
     
     def add_internal_edge(self, v: int, d: float, e_ins_init: List[int] = [], e_outs_init: List[int] = []):
         """
@@ -209,75 +581,203 @@ class ExtendedCircuit:
     
     def update_internal_edge(self, f: int, e_ins_update: List[int] = [], e_outs_update: List[int] = []):
         f_obj = self.get_internal_edge(f)
+        self._invalidate()
         
         for e_in in e_ins_update:
             e_in_obj = self.get_external_edge(e_in)
+            if e_in_obj.v not in (-1, f_obj.v):
+                raise Exception(f"External edge {e_in} ends on vertex {e_in_obj.v} rather than {f_obj.v}")
             e_in_obj.v = f_obj.v
             e_in_obj.f_bs.add(f)
         f_obj.e_ins.update(e_ins_update)
         
         for e_out in e_outs_update:
             e_out_obj = self.get_external_edge(e_out)
+            if e_out_obj.u not in (-1, f_obj.v):
+                raise Exception(f"External edge {e_out} starts from vertex {e_out_obj.u} rather than {f_obj.v}")
             e_out_obj.u = f_obj.v
             e_out_obj.f_as.add(f)
         f_obj.e_outs.update(e_outs_update)
     
-    """ Tasks """
-    def solve_retiming(self, c: float, external_port_vertices: List[int] = [0]): # (1.)
+    """ Helpers """
+    def _index(self) -> Dict[str, np.ndarray]:
         """
-            Compute the retiming r on given clock period c.
-            Return a legal r if feasible, or return False.
+            Flattened G, cached until modified:
+                `u`, `v`, `w`: of the external edges;
+                `d_a`: max{d(f), f in f_as(e)}, -inf if e is not driven by any internal edge;
+                `e_outs_ptr`, `e_outs`: CSR of the edges grouped by start vertex, i.e. e_outs(v) = e_outs[e_outs_ptr[v]:e_outs_ptr[v + 1]];
+                `f_v`, `f_d`: of the internal edges;
+                `f_ins_ptr`, `f_ins`, `f_outs_ptr`, `f_outs`: CSR of e_ins(f) and e_outs(f) (sorted);
+                `e_f_bs_ptr`, `e_f_bs`: CSR of f_bs(e).
+        """
+        if self._index_cache is None:
+            n_V, n_E = len(self.V), len(self.E)
+            u = np.array([e_obj.u for e_obj in self.E], dtype = np.int64)
+            v = np.array([e_obj.v for e_obj in self.E], dtype = np.int64)
+            if n_E > 0 and (min(u.min(), v.min()) < 0 or max(u.max(), v.max()) >= n_V):
+                raise Exception("External edge(s) with unknown endpoint(s), use add_external_edge() to add edges explicitly")
             
-            Construct mixed-integer difference constraints and solve using MIDCSolver.
+            def _csr(lists: List[List[int]]):
+                ptr = np.zeros(len(lists) + 1, dtype = np.int64)
+                np.cumsum([len(l) for l in lists], out = ptr[1:])
+                return ptr, np.array([x for l in lists for x in l], dtype = np.int64)
+            
+            f_d = np.array([f_obj.d for f_obj in self.F], dtype = np.float64)
+            f_ins_ptr, f_ins = _csr([sorted(f_obj.e_ins) for f_obj in self.F])
+            f_outs_ptr, f_outs = _csr([sorted(f_obj.e_outs) for f_obj in self.F])
+            e_f_bs_ptr, e_f_bs = _csr([sorted(e_obj.f_bs) for e_obj in self.E])
+            
+            d_a = np.full(n_E, -math.inf)
+            np.maximum.at(d_a, f_outs, np.repeat(f_d, np.diff(f_outs_ptr)))
+            
+            e_outs = np.argsort(u, kind = "stable").astype(np.int64)
+            e_outs_ptr = np.zeros(n_V + 1, dtype = np.int64)
+            np.cumsum(np.bincount(u, minlength = n_V), out = e_outs_ptr[1:])
+            
+            self._index_cache = {
+                "u": u, "v": v, "w": np.array([e_obj.w for e_obj in self.E], dtype = np.int64), "d_a": d_a,
+                "e_outs_ptr": e_outs_ptr, "e_outs": e_outs,
+                "f_v": np.array([f_obj.v for f_obj in self.F], dtype = np.int64), "f_d": f_d,
+                "f_ins_ptr": f_ins_ptr, "f_ins": f_ins, "f_outs_ptr": f_outs_ptr, "f_outs": f_outs,
+                "e_f_bs_ptr": e_f_bs_ptr, "e_f_bs": e_f_bs
+            }
+        return self._index_cache
+    
+    def fingerprint(self) -> str:
+        """
+            sha256 of G, see RetimingCache. Invariant to the order of the edges:
+                the external edges as sorted (u, v, w), and the internal edges as sorted (v, d, sorted (u, v, w) of e_ins, ... of e_outs).
+        """
+        index = self._index()
+        triples = np.stack([index["u"], index["v"], index["w"]], axis = 1).tolist()
+        edges = sorted(tuple(t) for t in triples)
+        bundles = sorted((
+            int(index["f_v"][f]), float(index["f_d"][f]),
+            sorted(tuple(triples[e]) for e in index["f_ins"][index["f_ins_ptr"][f]:index["f_ins_ptr"][f + 1]]),
+            sorted(tuple(triples[e]) for e in index["f_outs"][index["f_outs_ptr"][f]:index["f_outs_ptr"][f + 1]])
+        ) for f in range(len(self.F)))
+        return hashlib.sha256(repr((len(self.V), edges, bundles)).encode('utf-8')).hexdigest()
+    
+    def _h_edges(self, external_port_vertices: List[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+            Expanded connectivity e_a --f-> e_b for all f not on the external port vertices, return (e_a[], e_b[], f[]).
+        """
+        index = self._index()
+        fs = np.flatnonzero(~np.isin(index["f_v"], external_port_vertices))
+        n_ins = (index["f_ins_ptr"][fs + 1] - index["f_ins_ptr"][fs])
+        n_outs = (index["f_outs_ptr"][fs + 1] - index["f_outs_ptr"][fs])
+        f_of_pair = np.repeat(fs, n_ins * n_outs)
+        
+        # the k-th pair of f is (e_ins(f)[k // n_outs(f)], e_outs(f)[k % n_outs(f)])
+        starts = np.repeat(np.cumsum(n_ins * n_outs) - n_ins * n_outs, n_ins * n_outs)
+        k = np.arange(f_of_pair.size, dtype = np.int64) - starts
+        n_outs_of_pair = np.repeat(n_outs, n_ins * n_outs)
+        e_a = index["f_ins"][index["f_ins_ptr"][f_of_pair] + k // np.maximum(n_outs_of_pair, 1)]
+        e_b = index["f_outs"][index["f_outs_ptr"][f_of_pair] + k % np.maximum(n_outs_of_pair, 1)]
+        return e_a, e_b, f_of_pair
+    
+    """ Tasks """
+    def _constraint_system(self, external_port_vertices: List[int]) -> MIDCSolver:
+        """
+            Construct mixed-integer difference constraints with c as the parameter, cached until G is modified.
             Variable 0 ~ |V| - 1 are integer variables (i.e. r(v)); Variable |V| ~ |V| + |E| - 1 are real variables (i.e. R(e)).
         """
-        c += ExtendedCircuit.EPSILON
+        key = tuple(external_port_vertices)
+        if self._constraints is not None and self._constraints[0] == key:
+            return self._constraints[1]
         
-        solver = MIDCSolver(n = len(self.V) + len(self.E), k = len(self.V))
+        index = self._index()
+        u, v, w = index["u"].tolist(), index["v"].tolist(), index["w"].tolist()
+        n_V = len(self.V)
+        solver = MIDCSolver(n = n_V + len(self.E), k = n_V)
         
         r = lambda v: v
-        R = lambda e: len(self.V) + e
+        R = lambda e: n_V + e
         
         # 16.1  r(u) - R(e) <= -d(f) / c, for f --e-> ?, f in F_u
-        for e, e_obj in enumerate(self.E):
-            d_f_max = 0
-            for f in e_obj.f_as:
-                f_obj = self.get_internal_edge(f)
-                d_f_max = max(d_f_max, f_obj.d)
-            solver.add_constraint(r(e_obj.u), R(e), -d_f_max / c)
-            # print(f"r{e_obj.u} - R{e} <= {-d_f_max / c}")
+        for e, d_f_max in enumerate(np.maximum(index["d_a"], 0.0).tolist()):
+            solver.add_constraint(r(u[e]), R(e), 0, -d_f_max)
         
         # 16.2  R(e) - r(u) <= 1, for u --e-> ?
-        for e, e_obj in enumerate(self.E):
-            solver.add_constraint(R(e), r(e_obj.u), 1)
-            # print(f"R{e} - r{e_obj.u} <= 1")
+        for e in range(len(self.E)):
+            solver.add_constraint(R(e), r(u[e]), 1)
         
         # 16.3  r(u) - r(v) <= w(e), for u --e-> v
         uv_w_min = {}
-        for e_obj in self.E:
-            key = (e_obj.u, e_obj.v)
-            value = uv_w_min.get(key)
-            uv_w_min[key] = min(e_obj.w, value) if value is not None else e_obj.w # pick minimum w(e) between u and v
-        for (u, v), w_e in uv_w_min.items():
-            solver.add_constraint(r(u), r(v), w_e)
-            # print(f"r{u} - r{v} <= {w_e}")
-        
-        # 16.4  R(e_a) - R(e_b) <= w(e_a) - d(f) / c, for e_a --f-> e_b (The connectivity from e_a to e_b through f)
-        for f_obj in self.F:
-            for (e_a, e_b) in [(x, y) for x in f_obj.e_ins for y in f_obj.e_outs]:
-                e_a_obj = self.get_external_edge(e_a)
-                
-                # if e_a is a output edge of an external port vertex, this constraint should be deserted. It considers the delay from tail to head in cycle.
-                if e_a_obj.u in external_port_vertices:
-                    continue
-                
-                w_e_a = e_a_obj.w
-                solver.add_constraint(R(e_a), R(e_b), w_e_a - f_obj.d / c)
-                # print(f"R{e_a} - R{e_b} <= {w_e_a - f_obj.d / c}")
+        for e in range(len(self.E)):
+            key_uv = (u[e], v[e])
+            value = uv_w_min.get(key_uv)
+            uv_w_min[key_uv] = min(w[e], value) if value is not None else w[e] # pick minimum w(e) between u and v
+        for (u_e, v_e), w_e in uv_w_min.items():
+            solver.add_constraint(r(u_e), r(v_e), w_e)
+        
+        # 16.4  R(e_a) - R(e_b) <= w(e_a) - d(f) / c, for e_a --f-> e_b (The connectivity from e_a to e_b through f), f not on the port vertices
+        e_as, e_bs, fs = self._h_edges(external_port_vertices)
+        for e_a, e_b, d_f in zip(e_as.tolist(), e_bs.tolist(), index["f_d"][fs].tolist()):
+            solver.add_constraint(R(e_a), R(e_b), w[e_a], -d_f)
         
+        self._constraints = (key, solver)
+        return solver
+    
+    def solve_retiming(self, c: float, external_port_vertices: List[int] = [0], r_init: List[int] = None, method: str = "feas"): # (1.)
+        """
+            Compute the retiming r on given clock period c.
+            Return a legal r if feasible, or return False.
+            `method`:
+                "feas": FEAS algorithm on the extended model, see _feas(). `r_init`: warm start as in SimpleCircuit/solve_retiming.
+                "midc": refresh the c-dependent weights of the cached constraint system (see _constraint_system()) and solve it using MIDCSolver,
+                    which warm starts from its last feasible solution if c decreases, e.g. in the binary search of minimize_clock_period().
+        """
+        if method == "feas":
+            return self._feas(c, external_port_vertices, r_init = r_init)
+        elif method != "midc":
+            raise Exception(f"Unsupported retiming method \'{method}\'")
+        
+        solver = self._constraint_system(external_port_vertices)
+        solver.set_parameter(c + ExtendedCircuit.EPSILON)
         solution = solver.solve()
         return False if not solution else solution[:len(self.V)]
     
+    def _feas(self, c: float, external_port_vertices: List[int], r_init: List[int] = None):
+        """
+            Increment r(v) for every vertex v having an internal edge f with delta(f) > c (see _clock_period()), as FEAS does;
+                a zero-weight edge v --e-> y then forces r(y) to be incremented too (w_r(e) >= 0), since with per-port delays
+                y is not necessarily violating. Both are necessary for any legal r' >= r achieving c, so the least r is still found.
+            At most |V| - 1 iterations, and c is infeasible once every vertex has been retimed (see SimpleCircuit/_feas).
+        """
+        index = self._index()
+        n_V, w, u, v, f_v = len(self.V), index["w"], index["u"], index["v"], index["f_v"]
+        e_outs_ptr, e_outs, v_list = index["e_outs_ptr"].tolist(), index["e_outs"].tolist(), v.tolist()
+        c = c + ExtendedCircuit.EPSILON
+        
+        r = np.zeros(n_V, dtype = np.int64) if r_init is None else np.array(r_init, dtype = np.int64)
+        w_r = w + r[v] - r[u]
+        for _ in range(n_V - 1):
+            _, delta = self._clock_period(w_r, external_port_vertices)
+            violated = np.zeros(n_V, dtype = bool)
+            violated[f_v[delta > c]] = True
+            if not violated.any():
+                break
+            
+            # closure along zero-weight edges
+            is_zero = (w_r == 0).tolist()
+            stack = np.flatnonzero(violated).tolist()
+            while stack:
+                x = stack.pop()
+                for k in range(e_outs_ptr[x], e_outs_ptr[x + 1]):
+                    e = e_outs[k]
+                    if is_zero[e] and not violated[v_list[e]]:
+                        violated[v_list[e]] = True
+                        stack.append(v_list[e])
+            
+            r[violated] += 1
+            w_r = w + r[v] - r[u]
+            if r.min() > 0:
+                return False
+        
+        Phi_Gr, _ = self._clock_period(w_r, external_port_vertices)
+        return r.tolist() if Phi_Gr <= c else False
+    
     def apply_retiming(self, r: List[int]): # (2.)
         """
             Apply the retiming r on the graph.
@@ -285,50 +785,54 @@ class ExtendedCircuit:
         """
         for e_obj in self.E:
             e_obj.w = e_obj.w + r[e_obj.v] - r[e_obj.u]
+        self._invalidate()
     
-    def compute_Ds(self, external_port_vertices: List[int] = [0]): # (3.)
+    def compute_Ds(self, external_port_vertices: List[int] = [0], mode: str = "streaming", memory_limit: int = None, workers: int = None): # (3.)
         """
             Run (Extended) WD algorithm to obtain D(u, v).
             Return sorted and de-duplicated D-value list.
             `H`: an auxiliary graph H<E, F, wd> for WD and CP.
                 In H, vertices are from E (external edges), edges are from F (internal edges);
-                The weight for H edge `e --f-> ?` wd(f) = (w(e), -d(f)), represented as a number: w(e) * C + C - d(f).
+                The weight for H edge `e --f-> ?` wd(f) = (w(e), -d(f)), represented as a number: w(e) * C - d(f),
+                    then made non-negative for Dijkstra by Johnson's reweighting (see _johnson_reweight()), as every cycle has w >= 1.
+            `mode`, `memory_limit`, `workers`: see SimpleCircuit/compute_Ds.
         """
-        C = sum([f_obj.d for f_obj in self.F]) + 1 # see SimpleCircuit/compute_Ds
+        if mode == "streaming":
+            scalars, arrays = self._wd_arrays(external_port_vertices)
+            return _run_wd("extended", scalars, arrays, len(self.V), memory_limit = memory_limit, workers = workers)
+        elif mode != "all_pairs":
+            raise Exception(f"Unsupported WD mode \'{mode}\'")
+        
+        scalars, arrays = self._wd_arrays(external_port_vertices)
+        C, D_min, h = scalars["C"], scalars["D_min"], arrays["h"].tolist()
         
         H = nx.DiGraph()
-        H_edges = [
-            # (e_a, e_b, OrderedPair(self.get_external_edge(e_a).w, -f_obj.d))
-            (e_a, e_b, self.get_external_edge(e_a).w * C + C - f_obj.d)
-            for f_obj in self.F
-            for e_a in f_obj.e_ins
-            for e_b in f_obj.e_outs
-            if f_obj.v not in external_port_vertices
-        ] # all edges e_a --f-> e_b, w/o f in external_port_vertices
-        H.add_weighted_edges_from(H_edges, weight = "weight")
+        e_as = np.repeat(np.arange(len(self.E)), np.diff(arrays["ptr"]))
+        H.add_weighted_edges_from(_min_weighted_edges(e_as, arrays["targets"], arrays["weights"]), weight = "weight")
         
         try:
             dists = dict(nx.all_pairs_dijkstra_path_length(H, weight = "weight"))
         except Exception:
             raise # Exception("There is something wrong with the circuit structure")
         
-        D_min = max([f_obj.d for f_obj in self.F]) # Phi(G) >= max{D(v, v) | v in V}, D(v, v) = max{d(f), f in F_v}
         Ds: Set = set([D_min])
         
+        d_a = arrays["d_a"].tolist()
+        e_outs = [sorted(self.get_vertex_e_outs(v)) for v in range(len(self.V))]
         for u in range(len(self.V)):
             for v in range(len(self.V)):
                 if u == v:
                     continue
                 
                 W_uv, D_uv = None, None
-                for e_a in self.get_vertex_e_outs(u):
-                    for e_b in self.get_vertex_e_outs(v):
-                        if e_a == e_b or dists.get(e_a) is None or dists[e_a].get(e_b) is None:
+                for e_a in e_outs[u]:
+                    for e_b in e_outs[v]:
+                        if dists.get(e_a) is None or dists[e_a].get(e_b) is None:
                             continue
                         
-                        dist: float = dists[e_a][e_b]
-                        W = dist // C
-                        D = max([self.get_internal_edge(f_a).d for f_a in self.get_external_edge(e_a).f_as]) + (W + 1) * C - dist # y = dist - (W + 1) * C
+                        dist: float = dists[e_a][e_b] - h[e_a] + h[e_b] - d_a[e_a] # W * C - D
+                        W = math.ceil((dist - 0.5) / C)
+                        D = W * C - dist
                         if D <= D_min:
                             continue
                         
@@ -337,146 +841,677 @@ class ExtendedCircuit:
                             D_uv = D
                 
                 if D_uv is not None:
-                    Ds.add(D_uv)
+                    Ds.add(min(round(D_uv, 9), scalars["D_max"]))
         
         return sorted(list(Ds))
     
-    def minimize_clock_period(self, external_port_vertices: List[int] = [0]): # (5.)
+    def _wd_arrays(self, external_port_vertices: List[int]):
+        """
+            Flatten H and the per-vertex e_outs into arrays for the streaming WD, see _extended_wd_candidates().
+        """
+        index = self._index()
+        D_min = float(index["f_d"].max()) if len(self.F) > 0 else 0.0 # Phi(G) >= max{D(v, v) | v in V}, D(v, v) = max{d(f), f in F_v}
+        C = len(self.E) * D_min + 1 # D <= d_a(e_a) + (|E| - 1) * max{d(f)} on a simple path of H, see SimpleCircuit/compute_Ds
+        
+        # H in CSR form
+        e_as, e_bs, fs = self._h_edges(external_port_vertices)
+        order = np.argsort(e_as, kind = "stable")
+        ptr = np.zeros(len(self.E) + 1, dtype = np.int64)
+        np.cumsum(np.bincount(e_as, minlength = len(self.E)), out = ptr[1:])
+        targets = e_bs[order]
+        weights, h = _johnson_reweight(ptr, targets, (index["w"][e_as] * C - index["f_d"][fs])[order])
+        
+        Phi_G, _ = self.compute_clock_period(external_port_vertices = external_port_vertices)
+        
+        scalars = {"C": C, "D_min": round(D_min, 9), "D_max": round(Phi_G, 9)} # candidates are rounded, see _PeriodCandidates
+        arrays = {
+            "ptr": ptr,
+            "targets": targets,
+            "weights": weights,
+            "h": h,
+            "e_outs_ptr": index["e_outs_ptr"],
+            "e_outs": index["e_outs"],
+            "owner": index["u"],
+            "d_a": index["d_a"]
+        }
+        return scalars, arrays
+    
+    def _clock_period(self, w: np.ndarray, external_port_vertices: List[int]):
+        """
+            (Extended) CP algorithm on weights w[], by topological sorting on the zero-weight part of H.
+            `delta[f]`: the max delay through zero-weight paths end on f (including d(f)), i.e. d(f) + max{delta(e), e in e_ins(f), w(e) = 0},
+                where delta(e) = max{delta(f'), f' in f_as(e)}; f on the external port vertices does not take its inputs' delta.
+        """
+        index = self._index()
+        n_E, n_F = len(self.E), len(self.F)
+        f_d, f_ins_ptr, f_ins = index["f_d"].tolist(), index["f_ins_ptr"], index["f_ins"]
+        f_outs_ptr, f_outs = index["f_outs_ptr"].tolist(), index["f_outs"].tolist()
+        e_f_bs_ptr, e_f_bs = index["e_f_bs_ptr"].tolist(), index["e_f_bs"].tolist()
+        is_zero = (w == 0).tolist()
+        is_port = np.isin(index["f_v"], external_port_vertices).tolist()
+        
+        # number of unresolved zero-weight inputs of f, and unresolved drivers of zero-weight e
+        f_of_ins = np.repeat(np.arange(n_F, dtype = np.int64), np.diff(f_ins_ptr))
+        f_pending = np.bincount(f_of_ins[w[f_ins] == 0], minlength = n_F)
+        f_pending = np.where(is_port, 0, f_pending).tolist()
+        e_pending = np.bincount(index["f_outs"], minlength = n_E).tolist()
+        
+        delta = [0.0] * n_F # max arrival among the inputs, then plus d(f)
+        delta_e = [0.0] * n_E
+        
+        def _release(e: int, stack: List[int]):
+            for k in range(e_f_bs_ptr[e], e_f_bs_ptr[e + 1]):
+                f = e_f_bs[k]
+                if is_port[f]:
+                    continue
+                delta[f] = max(delta[f], delta_e[e])
+                f_pending[f] -= 1
+                if f_pending[f] == 0:
+                    stack.append(f)
+        
+        stack = [f for f in range(n_F) if f_pending[f] == 0]
+        for e in range(n_E):
+            if is_zero[e] and e_pending[e] == 0:
+                _release(e, stack)
+        
+        resolved = 0
+        while stack:
+            f = stack.pop()
+            resolved += 1
+            delta[f] += f_d[f]
+            for k in range(f_outs_ptr[f], f_outs_ptr[f + 1]):
+                e = f_outs[k]
+                if not is_zero[e]:
+                    continue
+                delta_e[e] = max(delta_e[e], delta[f])
+                e_pending[e] -= 1
+                if e_pending[e] == 0:
+                    _release(e, stack)
+        
+        if resolved < n_F:
+            raise Exception("There is a zero-weight cycle in the circuit")
+        
+        delta = np.array(delta, dtype = np.float64)
+        return (float(delta.max()) if n_F > 0 else 0.0), delta
+    
+    def compute_clock_period(self, external_port_vertices: List[int] = [0]): # (4.)
+        """
+            Compute the minimum clock period without retiming, see _clock_period().
+            Return Phi(G) and delta[f].
+        """
+        return self._clock_period(self._index()["w"], external_port_vertices)
+    
+    def compute_retimed_clock_period(self, r: List[int], external_port_vertices: List[int] = [0]) -> float:
+        """
+            Phi(G_r) without modifying G.
         """
-            Perform binary search on sorted Ds, check answer by solving retiming.
+        index = self._index()
+        r = np.asarray(r, dtype = np.int64)
+        Phi_Gr, _ = self._clock_period(index["w"] + r[index["v"]] - r[index["u"]], external_port_vertices)
+        return Phi_Gr
+    
+    def minimize_clock_period(self, external_port_vertices: List[int] = [0], memory_limit: int = None, workers: int = None, method: str = "feas"): # (5.)
+        """
+            Perform binary search on sorted Ds (no larger than Phi(G), which r = 0 achieves), check answer by solving retiming.
             Return Phi(G_r) and the retiming r.
+            `memory_limit`, `workers`: see compute_Ds.
+            `method`: see solve_retiming(). FEAS is warm started by the r of the last feasible (i.e. larger) c.
         """
-        Ds = self.compute_Ds(external_port_vertices = external_port_vertices)
+        Phi_G, _ = self.compute_clock_period(external_port_vertices = external_port_vertices)
+        
+        print(f"[INFO] running WD algorithm") # TODO
+        Ds = self.compute_Ds(external_port_vertices = external_port_vertices, memory_limit = memory_limit, workers = workers)
+        Ds = [D for D in Ds if D < Phi_G]
         
         left, right = 0, len(Ds)
-        res = (None, None)
+        res = (Phi_G, [0] * len(self.V))
         while left < right:
             mid = (left + right) // 2
             c = Ds[mid]
             
-            solution = self.solve_retiming(c, external_port_vertices = external_port_vertices)
+            print(f"[INFO] retiming, try c = {c}, {right - left} selection(s) left") # TODO
+            t = time.time()
+            r_init = res[1] if method == "feas" else None
+            solution = self.solve_retiming(c, external_port_vertices = external_port_vertices, r_init = r_init, method = method)
+            print(f"[INFO] finished after {time.time() - t} (s)")
+            
             if solution is not False:
                 res = (c, solution)
                 right = mid
             else:
                 left = mid + 1
         
-        return res
+        return self.compute_retimed_clock_period(res[1], external_port_vertices = external_port_vertices), res[1] # <= c, as c may be rounded up
 
 
 class SimpleCircuit:
     """
         Simple circuit model with uniform functional element delays.
+        Vertices and edges are stored in NumPy arrays (d[] for vertices; u[], v[], w[] for edges),
+            with CSR adjacency (out-edges grouped by u, in-edges grouped by v) built lazily.
         Support:
             1. Solve retiming r for a given clock period c use FEAS algorithm.
             2. Apply retiming r on G to obtain G_r.
             3. Run WD algorithm to obtain D(u, v).
             4. Run CP algorithm to obtain Phi(G).
             5. Combine (3.), binary search and (1.) to solve clock-period-minimization problem.
+            6. Minimize the number of registers under a given clock period.
+            7. Solve (1.) on clusters in parallel first for large circuits.
+            8. Find the least number of registers after the inputs to meet a given clock period.
     """
     EPSILON = 1e-5
     
-    @dataclass
-    class VertexInfo:
-        d: float
-        head: int = -1 # first edge ID
-    
-    @dataclass
-    class EdgeInfo:
-        u: int # start vertex ID
-        v: int # end vertex ID
-        w: int # weight
-        next: int # next edge ID, -1 as EndOfList
-    
     def __init__(self):
-        self.V: List[SimpleCircuit.VertexInfo] = []
-        self.E: List[SimpleCircuit.EdgeInfo] = []
+        self._n: int = 0
+        self._m: int = 0
+        
+        self._d: np.ndarray = np.zeros(16, dtype = np.float64) # d[v], vertex delay
+        self._u: np.ndarray = np.zeros(16, dtype = np.int32) # u[e], start vertex ID
+        self._v: np.ndarray = np.zeros(16, dtype = np.int32) # v[e], end vertex ID
+        self._w: np.ndarray = np.zeros(16, dtype = np.int64) # w[e], weight
+        
+        self._csr: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray] = None # (out_ptr, out_edges, in_ptr, in_edges), None as outdated
+        
+        self._nets: List[List[int]] = [] # edge IDs sharing registers, see add_nets()
     
     @property
     def n(self):
-        return len(self.V)
+        return self._n
     
     @property
     def m(self):
-        return len(self.E)
+        return self._m
+    
+    @property
+    def d(self) -> np.ndarray:
+        return self._d[:self._n]
+    
+    @property
+    def u(self) -> np.ndarray:
+        return self._u[:self._m]
+    
+    @property
+    def v(self) -> np.ndarray:
+        return self._v[:self._m]
+    
+    @property
+    def w(self) -> np.ndarray:
+        return self._w[:self._m]
+    
+    @property
+    def nets(self) -> List[List[int]]:
+        return self._nets
     
     def deepcopy(self) -> 'SimpleCircuit':
         res = SimpleCircuit()
-        res.V = [SimpleCircuit.VertexInfo(d = vertex.d, head = vertex.head) for vertex in self.V]
-        res.E = [SimpleCircuit.EdgeInfo(u = edge.u, v = edge.v, w = edge.w, next = edge.next) for edge in self.E]
+        res._n, res._m = self._n, self._m
+        res._d, res._u, res._v, res._w = self._d.copy(), self._u.copy(), self._v.copy(), self._w.copy()
+        res._csr = self._csr # read-only, shared
+        res._nets = [net.copy() for net in self._nets]
         return res
     
+    def subcircuit(self, vertices: List[int]) -> 'SimpleCircuit':
+        """
+            The induced subcircuit on `vertices` (its vertex i is vertices[i]), w/o nets.
+        """
+        vertices = np.asarray(vertices, dtype = np.int64)
+        idx = np.full(self.n, -1, dtype = np.int64)
+        idx[vertices] = np.arange(vertices.size)
+        es = np.flatnonzero((idx[self.u] >= 0) & (idx[self.v] >= 0))
+        
+        res = SimpleCircuit()
+        res.add_vertices(self.d[vertices])
+        res.add_edges(np.stack([idx[self.u[es]], idx[self.v[es]], self.w[es]], axis = 1))
+        return res
+    
+    def fingerprint(self) -> str:
+        """
+            sha256 of G, see RetimingCache. Invariant to the order of the edges and the nets:
+                d, the edges as sorted (u, v, w), and the nets as multisets of their edges' (u, v, w).
+        """
+        # edges sorted by (u, v, w), and the rank of each edge's triple among the distinct ones
+        order = np.lexsort((self.w, self.v, self.u))
+        triples = np.stack([self.u[order], self.v[order], self.w[order]], axis = 1).astype(np.int64)
+        is_new = np.ones(self.m, dtype = bool)
+        is_new[1:] = (triples[1:] != triples[:-1]).any(axis = 1)
+        triple_of = np.empty(self.m, dtype = np.uint64)
+        triple_of[order] = np.cumsum(is_new) - 1
+        
+        # a net as the multiset of its edges' triples, i.e. sum of their mixed ranks (see _mix64()), order-independent
+        sizes = np.array([len(net) for net in self._nets], dtype = np.int64)
+        members = np.fromiter((e for net in self._nets for e in net), dtype = np.int64, count = int(sizes.sum()))
+        net_hashes = np.zeros(len(self._nets), dtype = np.uint64)
+        np.add.at(net_hashes, np.repeat(np.arange(len(self._nets)), sizes), _mix64(triple_of[members]))
+        
+        h = hashlib.sha256(np.ascontiguousarray(self.d, dtype = np.float64).tobytes())
+        h.update(triples.tobytes())
+        h.update(np.sort(net_hashes + _mix64(sizes.astype(np.uint64) + np.uint64(1 << 40))).tobytes())
+        return h.hexdigest()
+    
     """ Constructing """
+    @staticmethod
+    def _grow(arr: np.ndarray, size: int) -> np.ndarray:
+        if size <= arr.shape[0]:
+            return arr
+        res = np.zeros(max(size, 2 * arr.shape[0]), dtype = arr.dtype)
+        res[:arr.shape[0]] = arr
+        return res
+    
     def add_vertex(self, d: float):
-        self.V.append(SimpleCircuit.VertexInfo(d = d))
+        self.add_vertices([d])
     
     def add_vertices(self, d_list: List[float]):
-        self.V.extend([SimpleCircuit.VertexInfo(d = d) for d in d_list])
+        d_arr = np.asarray(d_list, dtype = np.float64).reshape(-1)
+        self._d = SimpleCircuit._grow(self._d, self._n + d_arr.shape[0])
+        self._d[self._n:self._n + d_arr.shape[0]] = d_arr
+        self._n += d_arr.shape[0]
+        self._csr = None
     
     def add_edge(self, u: int, v: int, w: int):
-        e = self.m
-        self.E.append(SimpleCircuit.EdgeInfo(
-            u = u,
-            v = v,
-            w = w,
-            next = self.V[u].head
-        ))
-        self.V[u].head = e
+        self.add_edges([(u, v, w)])
     
     def add_edges(self, info: List[Tuple]):
-        for entry in info:
-            self.add_edge(*entry)
+        info_arr = np.asarray(info, dtype = np.int64).reshape(-1, 3)
+        k = info_arr.shape[0]
+        self._u = SimpleCircuit._grow(self._u, self._m + k)
+        self._v = SimpleCircuit._grow(self._v, self._m + k)
+        self._w = SimpleCircuit._grow(self._w, self._m + k)
+        self._u[self._m:self._m + k] = info_arr[:, 0]
+        self._v[self._m:self._m + k] = info_arr[:, 1]
+        self._w[self._m:self._m + k] = info_arr[:, 2]
+        self._m += k
+        self._csr = None
+    
+    def add_net(self, edges: List[int]):
+        self.add_nets([edges])
+    
+    def add_nets(self, nets: List[List[int]]):
+        """
+            Mark groups of edges (starting from the same vertex) as driven by the same signal, so that they share their registers,
+                i.e. a net costs max{w(e), e in net} registers instead of sum{w(e)}. Edges in no net are independent.
+        """
+        for net in nets:
+            net = sorted(set(net))
+            if len(net) == 0:
+                continue
+            if len(set(self.u[net].tolist())) != 1:
+                raise Exception("edges of a net should start from the same vertex")
+            self._nets.append(net)
+    
+    """ Helpers """
+    def _adjacency(self):
+        """
+            CSR adjacency, out_edges[out_ptr[x]:out_ptr[x + 1]] are the IDs of edges start from x, and in_* for edges end on x.
+        """
+        if self._csr is None:
+            out_edges = np.argsort(self.u, kind = "stable").astype(np.int32)
+            out_ptr = np.zeros(self.n + 1, dtype = np.int64)
+            np.cumsum(np.bincount(self.u, minlength = self.n), out = out_ptr[1:])
+            
+            in_edges = np.argsort(self.v, kind = "stable").astype(np.int32)
+            in_ptr = np.zeros(self.n + 1, dtype = np.int64)
+            np.cumsum(np.bincount(self.v, minlength = self.n), out = in_ptr[1:])
+            
+            self._csr = (out_ptr, out_edges, in_ptr, in_edges)
+        return self._csr
+    
+    def partition(self, k: int) -> List[List[int]]:
+        """
+            Split the vertices except 0 into (at most) k clusters for solve_retiming_partitioned().
+            Clusters are consecutive in a topological order of G_0 w/o vertex 0, so that they are convex slices of the combinational logic;
+                each boundary is placed where the fewest edges cross it, within a quarter of a cluster around the even split.
+        """
+        order = self._topological_order()
+        if order is None:
+            raise Exception("Circle(s) exist(s)")
+        N = order.size
+        pos = np.full(self.n, -1, dtype = np.int64)
+        pos[order] = np.arange(N)
+        
+        # crossing[p]: number of edges between order[:p] and order[p:]
+        es = np.flatnonzero((self.u != 0) & (self.v != 0))
+        a, b = np.minimum(pos[self.u[es]], pos[self.v[es]]), np.maximum(pos[self.u[es]], pos[self.v[es]])
+        crossing = np.cumsum(np.bincount(a + 1, minlength = N + 2) - np.bincount(b + 1, minlength = N + 2))
+        
+        bounds = [0]
+        radius = N // (4 * max(k, 1))
+        for i in range(1, k):
+            lo, hi = max(i * N // k - radius, bounds[-1] + 1), min(i * N // k + radius, N - 1)
+            if lo <= hi:
+                bounds.append(lo + int(np.argmin(crossing[lo:hi + 1])))
+        bounds.append(N)
+        return [order[bounds[i]:bounds[i + 1]].tolist() for i in range(len(bounds) - 1) if bounds[i] < bounds[i + 1]]
+    
+    def _topological_order(self, with_host: bool = False) -> np.ndarray:
+        """
+            Vertices (except 0 if not `with_host`) in a topological order of G_0 (zero-weight edges), level by level.
+            Return None if there is a zero-weight cycle among them.
+        """
+        out_ptr, out_edges, _, _ = self._adjacency()
+        zero = self.w == 0
+        kept = np.ones(self.n, dtype = bool)
+        kept[0] = with_host
+        es = np.flatnonzero(zero & kept[self.u] & kept[self.v])
+        in_degrees = np.bincount(self.v[es], minlength = self.n)
+        
+        frontier = np.flatnonzero((in_degrees == 0) & kept)
+        levels = []
+        while frontier.size > 0:
+            levels.append(frontier)
+            es = SimpleCircuit._gather(out_ptr, out_edges, frontier)
+            targets = self.v[es[zero[es]]]
+            targets = targets[kept[targets]]
+            np.subtract.at(in_degrees, targets, 1)
+            if targets.size > 1:
+                targets = np.unique(targets)
+            frontier = targets[in_degrees[targets] == 0]
+        
+        order = np.concatenate(levels) if levels else np.zeros(0, dtype = np.int64)
+        if order.size < np.count_nonzero(kept):
+            return None
+        return order
+    
+    @staticmethod
+    def _gather(ptr: np.ndarray, idx: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """
+            Concatenate idx[ptr[x]:ptr[x + 1]] for all x in rows.
+        """
+        if rows.size == 1: # fast path for narrow (e.g. chain-like) frontiers
+            return idx[ptr[rows[0]]:ptr[rows[0] + 1]]
+        
+        starts = ptr[rows]
+        counts = ptr[rows + 1] - starts
+        total = int(counts.sum())
+        if total == 0:
+            return idx[:0]
+        offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(total)
+        return idx[offsets]
+    
+    def _update_delta(self, w_r: np.ndarray, delta: np.ndarray, seeds: np.ndarray = None):
+        """
+            Recompute delta[] under edge weights w_r[] in place, level by level over G_0 (batched topological sorting).
+            Only `seeds` (vertices whose incident edge weights changed) and their fan-out cone in G_0 can be affected,
+                other vertices keep their delta values and are treated as fixed sources. `seeds = None` means all vertices.
+        """
+        out_ptr, out_edges, _, _ = self._adjacency()
+        d, u, v = self.d, self.u, self.v
+        zero = w_r == 0
+        
+        # collect the affected vertices (zero-weight fan-out cone of the seeds)
+        if seeds is None:
+            affected = np.ones(self.n, dtype = bool)
+        else:
+            affected = np.zeros(self.n, dtype = bool)
+            affected[seeds] = True
+            frontier = np.unique(seeds)
+            while frontier.size > 0:
+                es = SimpleCircuit._gather(out_ptr, out_edges, frontier)
+                targets = v[es[zero[es]]]
+                frontier = np.unique(targets[~affected[targets]])
+                affected[frontier] = True
+        affected_idx = np.flatnonzero(affected)
+        
+        # reset affected vertices, take unaffected predecessors as fixed inputs
+        delta[affected_idx] = d[affected_idx]
+        es = np.flatnonzero(zero & affected[v])
+        from_fixed = ~affected[u[es]]
+        es_fixed, es_internal = es[from_fixed], es[~from_fixed]
+        np.maximum.at(delta, v[es_fixed], d[v[es_fixed]] + delta[u[es_fixed]])
+        in_degrees = np.bincount(v[es_internal], minlength = self.n)
+        
+        # topological sorting on the affected subgraph, a whole level at a time
+        frontier = affected_idx[in_degrees[affected_idx] == 0]
+        visited_count = 0
+        while frontier.size > 0:
+            visited_count += frontier.size
+            
+            es = SimpleCircuit._gather(out_ptr, out_edges, frontier)
+            es = es[zero[es]] # only zero weight edges are in G_0
+            targets = v[es]
+            np.maximum.at(delta, targets, d[targets] + delta[u[es]])
+            np.subtract.at(in_degrees, targets, 1)
+            
+            if targets.size > 1:
+                targets = np.unique(targets)
+            frontier = targets[in_degrees[targets] == 0]
+        
+        if visited_count < affected_idx.size:
+            raise Exception("Circle(s) exist(s)")
     
     """ Tasks """
-    def solve_retiming(self, c: float): # , external_port_vertices: List[int] = [0]): # (1.)
+    def solve_retiming(self, c: float, r_init: List[int] = None): # , external_port_vertices: List[int] = [0]): # (1.)
         """
             FEAS algorithm, compute the retiming r on given clock period c.
             Return a legal r if feasible, or return False.
+            Work on a single copy of the retimed edge weights w_r[]. In each iteration only the vertices whose r changed are updated,
+                delta[] is recomputed incrementally on their fan-out cone, and the loop stops early once no vertex violates c.
+                The result is the same as running the whole n - 1 iterations.
+                Infeasibility is reported as soon as every vertex has been retimed, see _feas().
+            `r_init`: warm start, a legal retiming between 0 and the result, e.g. the result for a larger clock period.
+                FEAS only increments r(v) where it is necessary, so it still returns the same (least) r.
+        """
+        return self._feas(c, r_init)[0]
+    
+    def _feas(self, c: float, r_init: List[int] = None, prefix_above: float = None):
+        """
+            See solve_retiming().
+            Return (r or False, number of iterations, r_prefix).
+            `r_prefix`: r before the first iteration that increments a vertex with delta(v) <= `prefix_above` (None if not given).
+                The increments before it are necessary for any clock period below `prefix_above`, so is r_prefix if r_init is.
         """
-        r = [0] * self.n
+        out_ptr, out_edges, in_ptr, in_edges = self._adjacency()
+        c = c + SimpleCircuit.EPSILON
         
+        if r_init is None:
+            r = np.zeros(self.n, dtype = np.int64)
+            w_r = self.w.copy()
+            _, delta = self.compute_clock_period()
+        else:
+            r = np.array(r_init, dtype = np.int64)
+            w_r = self.w + r[self.v] - r[self.u]
+            delta = self.d.copy()
+            self._update_delta(w_r, delta)
+        r_prefix = None
+        
+        iterations = 0
         for _ in range(self.n - 1):
-            G_r = self.deepcopy()
-            G_r.apply_retiming(r)
+            violated = np.flatnonzero(delta > c)
+            if violated.size == 0: # r will not change any more
+                break
+            if prefix_above is not None and r_prefix is None and delta[violated].min() <= prefix_above:
+                r_prefix = r.copy()
+            iterations += 1
+            
+            # w_r(e) = w(e) + r(v) - r(u)
+            r[violated] += 1
+            w_r[SimpleCircuit._gather(out_ptr, out_edges, violated)] -= 1
+            w_r[SimpleCircuit._gather(in_ptr, in_edges, violated)] += 1
             
-            _, delta = G_r.compute_clock_period()
+            self._update_delta(w_r, delta, violated)
             
-            for idx in range(G_r.n):
-                if delta[idx] > c:
-                    r[idx] += 1
+            if r.min() > 0: # the least r has min{r} = 0 (shift it otherwise), and r never exceeds it, so c is infeasible
+                break
         
-        G_r = self.deepcopy()
-        G_r.apply_retiming(r)
-        Phi_Gr, _ = G_r.compute_clock_period()
+        if prefix_above is not None and r_prefix is None:
+            r_prefix = r
+        feasible = self.n == 0 or delta.max() <= c
+        return (r.tolist() if feasible else False), iterations, r_prefix
+    
+    def solve_retiming_partitioned(self, c: float, partitions: int, workers: int = None):
+        """
+            Same result as solve_retiming(c), with most of the FEAS iterations run on `partitions` clusters (see partition()) in parallel.
+            `workers`: number of processes for the clusters, None or 1 to run in the current process.
+            The clusters give a lower bound of the least r (see _partitioned_start()), then FEAS on G finishes from there,
+                i.e. only for the combinational paths across the boundaries.
+        """
+        with self._partitioned(partitions, workers) as partitioned:
+            r_start = self._partitioned_start(c, partitioned)
+            if r_start is False:
+                return False
+            return self._feas(c, r_start)[0]
+    
+    @contextlib.contextmanager
+    def _partitioned(self, partitions: int, workers: int = None):
+        """
+            Clusters, their induced subcircuits and the process pool for them, kept during a search. Yield None if `partitions` is None.
+        """
+        if partitions is None:
+            yield None
+            return
+        
+        clusters = self.partition(partitions)
+        subcircuits = [self.subcircuit(cluster) for cluster in clusters]
+        boundary_count = int(np.count_nonzero((self.u != 0) & (self.v != 0))) - sum(G.m for G in subcircuits)
+        print(f"[INFO] partitioned into {len(clusters)} cluster(s), {boundary_count} edge(s) on the boundaries") # TODO
+        
+        if workers is None or workers <= 1 or len(clusters) <= 1:
+            yield {"clusters": clusters, "subcircuits": subcircuits, "executor": None}
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers = workers, initializer = _partition_worker_init, initargs = (subcircuits, )) as executor:
+                yield {"clusters": clusters, "subcircuits": subcircuits, "executor": executor}
+    
+    def _partitioned_start(self, c: float, partitioned: Dict, r_init: List[int] = None):
+        """
+            A legal lower bound (no less than `r_init`, a legal one) of the least r of G on c, or False if c is proven infeasible.
+            In each round, every cluster runs FEAS on its induced subcircuit from the current r (in parallel); the results are stitched
+                and legalized (see _legalize()), which passes the raised r across the boundaries to the next round, until r is stable.
+            The zero-weight paths of a subcircuit are ones of G, so every increment is necessary for G too.
+        """
+        clusters, subcircuits, executor = partitioned["clusters"], partitioned["subcircuits"], partitioned["executor"]
+        r = self._legalize(np.zeros(self.n, dtype = np.int64) if r_init is None else r_init)
+        
+        for _ in range(self.n):
+            r_inits = [r[cluster].tolist() for cluster in clusters]
+            if executor is not None:
+                rs = executor.map(_partition_worker_run, range(len(clusters)), [c] * len(clusters), r_inits)
+            else:
+                rs = map(_local_feas, subcircuits, [c] * len(clusters), r_inits)
+            
+            r_next = r.copy()
+            for cluster, r_cluster in zip(clusters, rs):
+                r_next[cluster] = r_cluster
+            r_next = self._legalize(r_next)
+            
+            if r_next.min() > 0: # see _feas()
+                return False
+            if np.array_equal(r_next, r):
+                break
+            r = r_next
+        return r
+    
+    def _legalize(self, r: np.ndarray) -> np.ndarray:
+        """
+            The least legal r' >= r, i.e. r'(v) >= r'(u) - w(e) for all u --e-> v, by raising the ends of the illegal edges (SPFA).
+            Every raise is necessary for any legal r'' >= r, and cycles have positive weights, so it terminates.
+        """
+        out_ptr, out_edges, _, _ = self._adjacency()
+        out_ptr, out_edges, v, w = out_ptr.tolist(), out_edges.tolist(), self.v.tolist(), self.w.tolist()
+        r = np.asarray(r, dtype = np.int64)
+        res = r.tolist()
+        
+        queue = collections.deque(np.unique(self.u[self.w + r[self.v] - r[self.u] < 0]).tolist()) # starts of the illegal edges
+        in_queue = [False] * self.n
+        for x in queue:
+            in_queue[x] = True
+        while queue:
+            x = queue.popleft()
+            in_queue[x] = False
+            for k in range(out_ptr[x], out_ptr[x + 1]):
+                e = out_edges[k]
+                if res[v[e]] < res[x] - w[e]:
+                    res[v[e]] = res[x] - w[e]
+                    if not in_queue[v[e]]:
+                        in_queue[v[e]] = True
+                        queue.append(v[e])
+        return np.array(res, dtype = np.int64)
+    
+    def _probe(self, c: float, warm: Dict, next_c: float = None):
+        """
+            FEAS on c in the binary searches of minimize_clock_period(), warm started by and updating `warm`:
+                "r_hi": r of the smallest feasible c so far, valid for any smaller c;
+                "r_lo", "r_lo_below": r_prefix of the last infeasible probe, valid for c < r_lo_below;
+                "iterations", "saved": FEAS iterations run, and a lower bound of the ones saved (from r = 0, reaching r needs at least max{r} iterations);
+                "partitioned": (optional) see _partitioned(), to start from the stitched r of the clusters as well.
+            `next_c`: the next c to try if this one is infeasible, for r_prefix.
+        """
+        r_init, below = warm["r_hi"], math.inf
+        if warm["r_lo"] is not None and c < warm["r_lo_below"]:
+            r_init = warm["r_lo"] if r_init is None else np.maximum(r_init, warm["r_lo"])
+            below = warm["r_lo_below"]
+        if warm.get("partitioned") is not None:
+            r_init = self._partitioned_start(c, warm["partitioned"], r_init)
+            if r_init is False:
+                return False
+            next_c = None # the partitioned start is only valid for periods up to c, so would be r_prefix
         
-        return r if Phi_Gr <= c else False
+        solution, iterations, r_prefix = self._feas(c, r_init, prefix_above = next_c)
+        warm["iterations"] += iterations
+        if solution is not False:
+            warm["r_hi"] = np.asarray(solution, dtype = np.int64)
+            warm["saved"] += max(max(solution, default = 0) - iterations, 0)
+        elif r_prefix is not None:
+            warm["r_lo"], warm["r_lo_below"] = r_prefix, min(below, next_c)
+        return solution
     
     def apply_retiming(self, r: List[int]): # (2.)
         """
             Apply the retiming r on the graph.
             Equation (2): w_r(e) = w(e) + r(v) - r(u).
         """
-        for edge in self.E:
-            edge.w = edge.w + r[edge.v] - r[edge.u]
+        r = np.asarray(r, dtype = np.int64)
+        self.w[:] += r[self.v] - r[self.u]
+    
+    def _wd_arrays(self):
+        """
+            CSR form of G_prime for the streaming WD, see compute_Ds() and _simple_wd_candidates().
+        """
+        out_ptr, out_edges, _, _ = self._adjacency()
+        C = sum(self.d.tolist()) + 1 # D(u, v) - d(v) < C on simple paths, so (W, -D) is ordered by W * C - D
+        targets = self.v[out_edges].astype(np.int64)
+        weights, h = _johnson_reweight(out_ptr, targets, self.w[out_edges] * C - self.d[self.u[out_edges]]) # every cycle has w >= 1, i.e. positive
+        
+        Phi_G, _ = self.compute_clock_period()
+        
+        scalars = {"C": C, "D_min": round(float(self.d.max()), 9), "D_max": round(Phi_G, 9)} # candidates are rounded, see _PeriodCandidates
+        arrays = {
+            "ptr": out_ptr,
+            "targets": targets,
+            "weights": weights,
+            "h": h,
+            "d": self.d.copy()
+        }
+        return scalars, arrays
     
-    def compute_Ds(self): # , external_port_vertices: List[int] = [0]): # (3.)
+    def compute_Ds(self, mode: str = "streaming", memory_limit: int = None, workers: int = None): # , external_port_vertices: List[int] = [0]): # (3.)
         """
             Run WD algorithm to obtain D(u, v).
             Return sorted and de-duplicated D-value list.
-            `G_prime`: reweighted G, `u --e--> ?`.weight = (w(e), -d(u)), represented as a number: w(e) * C + C - d(u).
+            `G_prime`: reweighted G, `u --e--> ?`.weight = (w(e), -d(u)), represented as a number: w(e) * C - d(u),
+                then made non-negative for Dijkstra by Johnson's reweighting (see _johnson_reweight()), as every cycle has w >= 1.
+            `mode`:
+                "streaming": run single-source Dijkstra one source at a time on the CSR graph, only the candidate set is kept,
+                    bounded by `memory_limit` (bytes, see _PeriodCandidates);
+                "all_pairs": networkx all-pairs Dijkstra, O(|V|^2) memory.
+            `workers`: (streaming) number of worker processes sharing the sources, None or 1 to run in the current process.
         """
-        C = sum([vertex.d for vertex in self.V]) + 1 # to avoid path_delay = C, leading to the error in dist // C
+        if mode == "streaming":
+            scalars, arrays = self._wd_arrays()
+            return _run_wd("simple", scalars, arrays, self.n, memory_limit = memory_limit, workers = workers)
+        elif mode != "all_pairs":
+            raise Exception(f"Unsupported WD mode \'{mode}\'")
+        
+        scalars, arrays = self._wd_arrays()
+        C, D_min, h, d = scalars["C"], scalars["D_min"], arrays["h"].tolist(), arrays["d"].tolist()
         
         G_prime = nx.DiGraph()
-        G_prime_edges = [(edge.u, edge.v, edge.w * C + C - self.V[edge.u].d) for edge in self.E]
-        G_prime.add_weighted_edges_from(G_prime_edges, weight = "weight")
+        us = np.repeat(np.arange(self.n), np.diff(arrays["ptr"]))
+        G_prime.add_weighted_edges_from(_min_weighted_edges(us, arrays["targets"], arrays["weights"]), weight = "weight")
         
         try:
             dists = dict(nx.all_pairs_dijkstra_path_length(G_prime, weight = "weight"))
         except Exception:
             raise
         
-        D_min = max([vertex.d for vertex in self.V])
         Ds: Set = set([D_min])
         
         for u in range(self.n):
@@ -484,12 +1519,12 @@ class SimpleCircuit:
                 if u == v or dists.get(u) is None or dists[u].get(v) is None:
                     continue
                 
-                dist: float = dists[u][v]
-                W_uv = dist // C
-                D_uv = self.V[v].d + (W_uv + 1) * C - dist # y = dist - (W_uv + 1) * C
+                dist: float = dists[u][v] - h[u] + h[v] # W_uv * C - (D_uv - d(v))
+                W_uv = math.ceil((dist - 0.5) / C)
+                D_uv = d[v] + W_uv * C - dist
                 
                 if D_uv >= D_min:
-                    Ds.add(D_uv)
+                    Ds.add(min(round(D_uv, 9), scalars["D_max"]))
         
         return sorted(list(Ds))
     
@@ -498,56 +1533,55 @@ class SimpleCircuit:
             Compute the minimum clock period without retiming by performing topological sorting.
             `delta[v]`: the max delay through zero-weight path end on v.
         """
-        in_degrees: List[int] = [0] * self.n
-        visited: List[bool] = [False] * self.n
-        delta: List[int] = [vertex.d for vertex in self.V]
-        
-        # compute the in-degrees, ignoring the edges with non-zero weight
-        for edge in self.E:
-            if edge.w == 0:
-                in_degrees[edge.v] += 1
-        
-        q: List[int] = [idx for idx, in_deg in enumerate(in_degrees) if in_deg == 0]
-        while q:
-            u = q.pop()
-            visited[u] = True
-            
-            e = self.V[u].head
-            while e != -1:
-                if self.E[e].w == 0: # only zero weight edges are in G_0
-                    v = self.E[e].v
-                    if visited[v]:
-                        raise Exception("Circle(s) exist(s)")
-                    
-                    # decrease v's in-degree, enqueue if zero
-                    in_degrees[v] -= 1
-                    if in_degrees[v] == 0:
-                        q.append(v)
-                    
-                    # update delta[v]
-                    delta[v] = max(delta[v], self.V[v].d + delta[u])
-                
-                e = self.E[e].next
-        
-        return max(delta), delta
+        delta = self.d.copy()
+        self._update_delta(self.w, delta)
+        return float(delta.max()) if self.n > 0 else 0.0, delta
     
-    def minimize_clock_period(self): # , external_port_vertices: List[int] = [0]): # (5.)
+    def compute_retimed_clock_period(self, r: List[int]) -> float:
+        """
+            Phi(G_r) without modifying G.
+        """
+        G_r = self.deepcopy()
+        G_r.apply_retiming(r)
+        Phi_Gr, _ = G_r.compute_clock_period()
+        return Phi_Gr
+    
+    def minimize_clock_period(self, memory_limit: int = None, workers: int = None, method: str = "wd", tolerance: float = 1e-2, partitions: int = None): # , external_port_vertices: List[int] = [0]): # (5.)
         """
-            Perform binary search on sorted Ds, check answer by solving retiming.
             Return Phi(G_r) and the retiming r.
+            `method`:
+                "wd": perform binary search on sorted Ds, check answer by solving retiming. Exact unless Ds is rounded under `memory_limit`.
+                    `memory_limit`, `workers`: see compute_Ds.
+                "bisect": skip WD, binary search a real-valued c in [max{d(v)}, Phi(G)] until the interval is narrower than `tolerance`,
+                    then snap to the Phi(G_r) actually achieved. Within `tolerance` of the optimum, at the cost of FEAS runs only.
+            `partitions`: solve each probe on this many clusters first (`workers` processes), see solve_retiming_partitioned().
+        """
+        if method not in ("wd", "bisect"):
+            raise Exception(f"Unsupported clock-period-minimization method \'{method}\'")
+        
+        with self._partitioned(partitions, workers) as partitioned:
+            if method == "bisect":
+                return self._minimize_clock_period_bisect(tolerance, partitioned)
+            return self._minimize_clock_period_wd(memory_limit, workers, partitioned)
+    
+    def _minimize_clock_period_wd(self, memory_limit: int, workers: int, partitioned: Dict = None):
+        """
+            See minimize_clock_period().
         """
         print(f"[INFO] running WD algorithm") # TODO
-        Ds = self.compute_Ds() # (external_port_vertices = external_port_vertices)
+        Ds = self.compute_Ds(memory_limit = memory_limit, workers = workers) # (external_port_vertices = external_port_vertices)
         
         left, right = 0, len(Ds)
         res = None
+        warm = {"r_hi": None, "r_lo": None, "r_lo_below": None, "iterations": 0, "saved": 0, "partitioned": partitioned} # see _probe()
         while left < right:
             mid = (left + right) // 2
             c = Ds[mid]
             
             print(f"[INFO] retiming, try c = {c}, {right - left} selection(s) left") # TODO
             t = time.time()
-            solution = self.solve_retiming(c) # , external_port_vertices = external_port_vertices)
+            next_c = Ds[(mid + 1 + right) // 2] if mid + 1 < right else None
+            solution = self._probe(c, warm, next_c) # , external_port_vertices = external_port_vertices)
             print(f"[INFO] finished after {time.time() - t} (s)")
             
             if solution is not False:
@@ -556,7 +1590,339 @@ class SimpleCircuit:
             else:
                 left = mid + 1
         
+        print(f"[INFO] {warm['iterations']} FEAS iteration(s) run, at least {warm['saved']} saved by warm starts")
+        if res is not None:
+            res = (self.compute_retimed_clock_period(res[1]), res[1]) # <= c, as c may be rounded up, see _PeriodCandidates
         return res
+    
+    def _minimize_clock_period_bisect(self, tolerance: float, partitioned: Dict = None):
+        """
+            WD-free clock-period minimization, see minimize_clock_period().
+            Phi(G_r) >= max{d(v)} for any r, and r = 0 achieves Phi(G).
+        """
+        left, right = float(self.d.max()), self.compute_clock_period()[0]
+        res = (right, [0] * self.n)
+        warm = {"r_hi": None, "r_lo": None, "r_lo_below": None, "iterations": 0, "saved": 0, "partitioned": partitioned} # see _probe()
+        while right - left > tolerance:
+            c = (left + right) / 2
+            
+            print(f"[INFO] retiming, try c = {c}, interval [{left}, {right}]") # TODO
+            t = time.time()
+            solution = self._probe(c, warm, (c + right) / 2 if right - c > tolerance else None)
+            print(f"[INFO] finished after {time.time() - t} (s)")
+            
+            if solution is not False:
+                Phi_Gr = self.compute_retimed_clock_period(solution) # <= c + EPSILON, snap to the achieved one
+                res = (Phi_Gr, solution)
+                right = min(Phi_Gr, c)
+            else:
+                left = c
+        
+        print(f"[INFO] {warm['iterations']} FEAS iteration(s) run, at least {warm['saved']} saved by warm starts")
+        return res
+    
+    def minimize_input_levels(self, c: float, workers: int = None, partitions: int = None):
+        """
+            The least L such that c is feasible after adding L registers on every edge from vertex 0 (i.e. after the input ports),
+                return (L, r), r on G with these registers, or False if there is no such L (e.g. c < max{d(v)}).
+            A retiming feasible for L is also feasible for L + 1, so is the least r no greater, i.e. r of the least feasible L so far
+                is a warm start for any smaller L (see solve_retiming()). L is galloped up from ceil(Phi(G) / c) - 1 until feasible,
+                then down (or bisected) until the infeasible one below it is found.
+            L starts from 1 if vertex 0 is on a zero-weight cycle of G (e.g. G of a combinational structure), which needs a register.
+            `partitions`, `workers`: see solve_retiming_partitioned().
+        """
+        if self.n == 0:
+            return 0, []
+        if c < self.d.max():
+            return False
+        
+        G_L = self.deepcopy()
+        from_host = (self.u == 0).astype(np.int64)
+        lower = 0 if self._topological_order(with_host = True) is not None else 1 # w/o registers, vertex 0 may close zero-weight cycles
+        upper = self.n # enough for a pipeline register on every edge of a DAG
+        
+        with G_L._partitioned(partitions, workers) as partitioned: # the clusters do not contain vertex 0, so do not depend on L
+            def probe(L: int, r_init: np.ndarray):
+                G_L.w[:] = self.w + L * from_host
+                if partitioned is not None:
+                    r_init = G_L._partitioned_start(c, partitioned, r_init)
+                    if r_init is False:
+                        return False
+                return G_L._feas(c, r_init)[0]
+            
+            G_L.w[:] = self.w + lower * from_host
+            Phi_G, _ = G_L.compute_clock_period()
+            L, step = min(max(math.ceil(Phi_G / c) - 1, lower), upper), 1
+            lo, hi, r_hi, probes = lower - 1, None, None, 0 # greatest infeasible L, least feasible L and its r
+            while hi is None:
+                probes += 1
+                solution = probe(L, None)
+                if solution is not False:
+                    hi, r_hi = L, np.asarray(solution, dtype = np.int64)
+                elif L == upper:
+                    return False
+                else:
+                    lo, L, step = L, min(L + step, upper), step * 2
+            
+            step = 1
+            while hi - lo > 1:
+                L, step = (max(hi - step, lower), step * 2) if lo < lower else ((lo + hi) // 2, step)
+                probes += 1
+                solution = probe(L, r_hi)
+                if solution is not False:
+                    hi, r_hi = L, np.asarray(solution, dtype = np.int64)
+                else:
+                    lo = L
+        
+        print(f"[INFO] {probes} level count(s) probed, {hi} level(s) needed for c = {c}") # TODO
+        return hi, r_hi.tolist()
+    
+    def _register_groups(self, nets: List[List[int]] = None) -> List[List[int]]:
+        """
+            Edge-ID groups sharing registers: the given nets (self.nets if None), and every other edge alone.
+        """
+        nets = self._nets if nets is None else nets
+        groups = [sorted(set(net)) for net in nets if len(net) > 0]
+        covered = np.zeros(self.m, dtype = bool)
+        for group in groups:
+            covered[group] = True
+        groups.extend([e] for e in np.flatnonzero(~covered).tolist())
+        return groups
+    
+    def count_registers(self, r: List[int] = None, nets: List[List[int]] = None) -> int:
+        """
+            Number of registers of G_r, a net shares its registers among the loads, i.e. sum{max{w_r(e), e in net}, net in nets}.
+            `nets`: lists of edge IDs driven by the same signal, None as self.nets (see add_nets()).
+        """
+        w_r = self.w if r is None else self.w + np.asarray(r, dtype = np.int64)[self.v] - np.asarray(r, dtype = np.int64)[self.u]
+        w_r = w_r.tolist()
+        return sum(max(w_r[e] for e in group) for group in self._register_groups(nets))
+    
+    def _period_constraints(self, c: float) -> Dict[Tuple[int, int], int]:
+        """
+            Period constraints r(u) - r(v) <= W(u, v) - 1 for D(u, v) > c, without the ones implied by others and the legality ones.
+            From each u, search in lexicographic order of (W, -D) and do not expand the vertices v with D(u, v) > c:
+                any path beyond v contains a sub-path u ~> v needing a register already.
+            Likewise, (u, v) is dropped if the path without u still exceeds c, it is implied by the one from the next vertex of u on the path.
+            Zero weight edges make the second key decrease, so labels are corrected (re-pushed) instead of settled once; G_0 is a DAG.
+            Only paths with delay within c are explored, rather than the O(|V|^2) pairs of the WD algorithm.
+            c is relaxed by EPSILON as in _feas(), so that the period accepted there is not violated by rounding here.
+        """
+        c = c + SimpleCircuit.EPSILON
+        out_ptr, out_edges, _, _ = self._adjacency()
+        ptr, targets, weights = out_ptr.tolist(), self.v[out_edges].tolist(), self.w[out_edges].tolist()
+        d = self.d.tolist()
+        
+        constraints = {}
+        for src in range(self.n):
+            label = {src: (0, -d[src])} # (W, -D)
+            Q = [(0, -d[src], src)]
+            while Q:
+                W, neg_D, x = heapq.heappop(Q)
+                if label[x] != (W, neg_D) or (x != src and -neg_D > c):
+                    continue
+                for idx in range(ptr[x], ptr[x + 1]):
+                    y = targets[idx]
+                    key = (W + weights[idx], neg_D - d[y])
+                    if y not in label or key < label[y]:
+                        label[y] = key
+                        heapq.heappush(Q, (key[0], key[1], y))
+            for y, (W, neg_D) in label.items():
+                if y != src and -neg_D > c and -neg_D - d[src] <= c:
+                    constraints[(src, y)] = W - 1
+        return constraints
+    
+    def _critical_cuts(self, r: np.ndarray, c: float) -> Dict[Tuple[int, int], int]:
+        """
+            For each v with delta(v) > c in G_r, take its critical path (zero weight in G_r), and every shortest sub-path p = u ~> x on it with d(p) > c.
+            Such a path needs a register, i.e. r(u) - r(x) <= w(p) - 1. Return {(u, x): w(p) - 1}, empty if Phi(G_r) <= c (+ EPSILON, see _feas()).
+        """
+        c = c + SimpleCircuit.EPSILON
+        d, u, v = self.d, self.u, self.v
+        w_r = self.w + r[v] - r[u]
+        delta = d.copy()
+        self._update_delta(w_r, delta)
+        
+        # pred[x]: the edge through which delta(x) is achieved
+        pred = np.full(self.n, -1, dtype = np.int64)
+        es = np.flatnonzero((w_r == 0) & (delta[v] == d[v] + delta[u]))
+        pred[v[es]] = es
+        
+        d_list, u_list, w_list, pred_list = d.tolist(), u.tolist(), self.w.tolist(), pred.tolist()
+        cuts = {}
+        done = np.zeros(self.n, dtype = bool) # already covered as a chain vertex
+        for x in np.flatnonzero(delta > c).tolist():
+            if done[x]:
+                continue
+            
+            # the whole critical chain ending on x, chain[0] = x
+            chain, chain_w = [x], [] # chain_w[i]: w(e) between chain[i + 1] and chain[i]
+            while pred_list[chain[-1]] >= 0:
+                e = pred_list[chain[-1]]
+                chain.append(u_list[e])
+                chain_w.append(w_list[e])
+            done[chain] = True
+            
+            # for every end on the chain, the shortest violating sub-path (two pointers, the start only moves towards the source)
+            # d(p) is summed from the start, in the same order as delta[], so that only paths really violating c are cut
+            j = 0
+            for i in range(len(chain)):
+                j = max(j, i)
+                while True:
+                    acc = 0.0
+                    for t in range(j, i - 1, -1):
+                        acc += d_list[chain[t]]
+                    if acc > c or j + 1 == len(chain):
+                        break
+                    j += 1
+                if acc <= c:
+                    break
+                key, k = (chain[j], chain[i]), sum(chain_w[i:j]) - 1
+                cuts[key] = min(cuts.get(key, k), k)
+        return cuts
+    
+    def minimize_registers(self, c: float, nets: List[List[int]] = None, max_rounds: int = 100):
+        """
+            Minimum-area retiming under clock period c (Leiserson and Saxe, Section 8), counting the registers shared by a net once.
+            Return r minimizing count_registers(r, nets) with Phi(G_r) <= c, or False if c is infeasible.
+            
+            A net u --e_i-> v_i costs max{w_r(e_i)} = w_max + r(m) - r(u) with a mirror vertex m and w_r(v_i -> m) = w_max - w(e_i) >= 0,
+                so the problem is an LP min{sum(r(m) - r(u))} over difference constraints r(a) - r(b) <= k_ab, whose dual is a min-cost flow
+                (arc a -> b of cost k_ab, demand(x) = objective coefficient of r(x)) solved by network simplex; r are then the potentials
+                satisfying all the constraints and being tight on the arcs carrying flow.
+            Period constraints are the non-redundant ones from _period_constraints(). As a guard (e.g. rounding on delays near c),
+                cuts on the critical paths of G_r (see _critical_cuts()) are added until Phi(G_r) <= c, at most `max_rounds` rounds.
+        """
+        r_feas = self.solve_retiming(c)
+        if r_feas is False:
+            return False
+        
+        u, v, w = self.u.tolist(), self.v.tolist(), self.w.tolist()
+        groups = self._register_groups(nets)
+        n_total = self.n + len(groups) # vertex n + i is the mirror of groups[i]
+        
+        # legality r(u) - r(v) <= w(e), and nets with more than one edge through their mirrors
+        constraints: Dict[Tuple[int, int], int] = {}
+        demand = [0] * n_total
+        def add(a: int, b: int, k: int):
+            constraints[(a, b)] = min(constraints.get((a, b), k), k)
+        for e in range(self.m):
+            add(u[e], v[e], w[e])
+        for idx, group in enumerate(groups):
+            if len(group) == 1:
+                demand[v[group[0]]] += 1
+                demand[u[group[0]]] -= 1
+            else:
+                w_max = max(w[e] for e in group)
+                for e in group:
+                    add(v[e], self.n + idx, w_max - w[e])
+                demand[self.n + idx] += 1
+                demand[u[group[0]]] -= 1
+        
+        for (a, b), k in self._period_constraints(c).items():
+            add(a, b, k)
+        
+        r = np.asarray(r_feas, dtype = np.int64)
+        for _ in range(max_rounds):
+            # dual: min-cost flow
+            H = nx.DiGraph()
+            H.add_nodes_from((x, {"demand": demand[x]}) for x in range(n_total))
+            H.add_edges_from((a, b, {"weight": k}) for (a, b), k in constraints.items())
+            _, flow = nx.network_simplex(H, demand = "demand", weight = "weight")
+            
+            # potentials
+            solver = MIDCSolver(n = n_total, k = 0)
+            for (a, b), k in constraints.items():
+                solver.add_constraint(a, b, k)
+                if flow[a][b] > 0:
+                    solver.add_constraint(b, a, -k)
+            x = solver.solve()
+            if x is False:
+                raise Exception("There is something wrong with the min-area retiming")
+            r_lp = np.rint(np.asarray(x[:self.n])).astype(np.int64)
+            
+            cuts = self._critical_cuts(r_lp, c)
+            if not cuts:
+                r = r_lp
+                break
+            for (a, b), k in cuts.items():
+                add(a, b, k)
+        else:
+            print(f"[INFO] min-area retiming stopped after {max_rounds} round(s), keep the FEAS result") # TODO
+        
+        r = r - r.min()
+        return r.tolist()
+
+
+class RetimingCache:
+    """
+        Persistent cache of retiming results on disk, one JSON file per entry under `path`.
+        An entry is keyed by the fingerprint of G and the problem solved on it (see key()), e.g. the target period and the method,
+            and records r and Phi(G_r) (r = None for an infeasible period).
+        At most `max_entries` entries are kept, the least recently used ones (by mtime) are evicted first.
+    """
+    def __init__(self, path: str = ".retiming_cache", max_entries: int = 1024):
+        self.path = os.path.abspath(path)
+        self.max_entries = max_entries
+    
+    @staticmethod
+    def key(G, **problem) -> str:
+        """
+            `G`: SimpleCircuit or ExtendedCircuit; `problem`: JSON-serializable parameters which the result depends on.
+        """
+        problem_str = json.dumps(problem, sort_keys = True)
+        return hashlib.sha256((type(G).__name__ + G.fingerprint() + problem_str).encode('utf-8')).hexdigest()
+    
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.path, key + ".json")
+    
+    def get(self, key: str) -> Dict:
+        """
+            Return {"r": r, "Phi_Gr": Phi(G_r), ...}, or None if missed.
+        """
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "r") as f:
+                entry = json.load(f)
+            os.utime(entry_path) # most recently used
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or "r" not in entry or "Phi_Gr" not in entry:
+            return None
+        return entry
+    
+    def put(self, key: str, r: List[int], Phi_Gr: float, **info):
+        """
+            `info`: other JSON-serializable fields of the entry, e.g. the number of levels found by pipelining.
+        """
+        os.makedirs(self.path, exist_ok = True)
+        entry_path = self._entry_path(key)
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({**info, "r": None if r is False else [int(x) for x in r], "Phi_Gr": Phi_Gr}, f)
+        os.replace(tmp_path, entry_path) # atomic, for concurrent builds sharing the cache
+        self._evict()
+    
+    def _evict(self):
+        entries = []
+        for filename in os.listdir(self.path):
+            if filename.endswith(".json"):
+                try:
+                    entries.append((os.path.getmtime(os.path.join(self.path, filename)), filename))
+                except OSError: # removed by another process
+                    pass
+        entries.sort()
+        for _, filename in entries[:max(len(entries) - self.max_entries, 0)]:
+            try:
+                os.remove(os.path.join(self.path, filename))
+            except OSError:
+                pass
+    
+    def clear(self):
+        if os.path.exists(self.path):
+            for filename in os.listdir(self.path):
+                if filename.endswith(".json"):
+                    os.remove(os.path.join(self.path, filename))
 
 
 # Test
@@ -1,18 +1,31 @@
 # This file is part of nodalhdl (https://github.com/Gralerfics/nodalhdl), distributed under the GPLv3. See LICENSE.
 
-import multiprocessing.pool
+from ..core.signal import *
 from ..core.structure import *
 from ..core.hdl import *
+from ..basic_arch.bits import *
+from ..basic_arch.arith import *
 
-import multiprocessing
+import asyncio
 import subprocess
 import os
 import shutil
 import re
+import copy
+import math
+import json
+import time
+import sqlite3
+import signal
+import heapq
 import hashlib
 import textwrap
+import threading
+import contextlib
 
-from typing import List, Dict
+from typing import List, Dict, Tuple
+
+import numpy as np
 
 
 class STAException(Exception): pass
@@ -30,6 +43,242 @@ class StaticTimingAnalyser:
         pass # to be override
 
 
+class TimingDatabase:
+    """
+        Persistent timing store (SQLite) of the modules analysed by Vivado, shared by all the projects using the same file.
+        An entry is keyed by (VHDL hash, part, tool version, synthesis options) and holds the parsed paths and the max delay.
+        Total size (of the paths) is kept under `max_size` bytes by evicting the least recently used entries.
+    """
+    DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".nodalhdl", "timing.db")
+    
+    def __init__(self, path: str = None, max_size: int = 1 << 30):
+        self.path = os.path.abspath(path if path is not None else TimingDatabase.DEFAULT_PATH)
+        self.max_size = max_size
+        
+        os.makedirs(os.path.dirname(self.path), exist_ok = True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode = WAL") # concurrent readers across processes
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS timing (
+                    vhdl_hash TEXT NOT NULL,
+                    part TEXT NOT NULL,
+                    tool_version TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    max_delay REAL NOT NULL,
+                    paths TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (vhdl_hash, part, tool_version, options)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS timing_last_access ON timing (last_access)")
+    
+    @contextlib.contextmanager
+    def _connect(self):
+        """
+            A short-lived connection per operation, as the analyses run in threads (and maybe other processes).
+        """
+        conn = sqlite3.connect(self.path, timeout = 60)
+        try:
+            with conn: # commit or rollback
+                yield conn
+        finally:
+            conn.close()
+    
+    def get(self, vhdl_hash: str, part: str, tool_version: str, options: str):
+        """
+            The cached report (VivadoSTA.TimingReport), or None.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT paths FROM timing WHERE vhdl_hash = ? AND part = ? AND tool_version = ? AND options = ?",
+                (vhdl_hash, part, tool_version, options)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE timing SET last_access = ? WHERE vhdl_hash = ? AND part = ? AND tool_version = ? AND options = ?",
+                (time.time(), vhdl_hash, part, tool_version, options)
+            )
+        return VivadoSTA.TimingReport.from_json(row[0])
+    
+    def put(self, vhdl_hash: str, part: str, tool_version: str, options: str, report: 'VivadoSTA.TimingReport'):
+        paths = report.to_json()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO timing VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (vhdl_hash, part, tool_version, options, VivadoSTA.report_delay(report), paths, len(paths), time.time())
+            )
+        self._evict()
+    
+    def query(self, vhdl_hash: str = None, part: str = None, tool_version: str = None, options: str = None) -> List[Dict]:
+        """
+            Entries (w/o paths) matching the given fields, most recently used first.
+        """
+        conditions = {"vhdl_hash": vhdl_hash, "part": part, "tool_version": tool_version, "options": options}
+        conditions = {column: value for column, value in conditions.items() if value is not None}
+        where = (" WHERE " + " AND ".join(f"{column} = ?" for column in conditions)) if conditions else ""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT vhdl_hash, part, tool_version, options, max_delay, size, last_access FROM timing{where} ORDER BY last_access DESC",
+                tuple(conditions.values())
+            ).fetchall()
+        columns = ["vhdl_hash", "part", "tool_version", "options", "max_delay", "size", "last_access"]
+        return [dict(zip(columns, row)) for row in rows]
+    
+    def size(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(SUM(size), 0) FROM timing").fetchone()[0]
+    
+    def _evict(self):
+        with self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM timing").fetchone()[0]
+            if total <= self.max_size:
+                return
+            victims = []
+            for rowid, size in conn.execute("SELECT rowid, size FROM timing ORDER BY last_access ASC"):
+                if total <= self.max_size:
+                    break
+                victims.append((rowid, ))
+                total -= size
+            conn.executemany("DELETE FROM timing WHERE rowid = ?", victims)
+        print(f"[INFO] {len(victims)} timing entry(ies) evicted")
+    
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM timing")
+    
+    def import_workspace(self, workspace_path: str, options: str, tool_version: str = "unknown") -> int:
+        """
+            Import the reports left in a (legacy) VivadoSTA workspace, i.e. `<workspace_path>/<vhdl_hash>/timing_report.txt`.
+            The part is read from the TCL script and the tool version from vivado.log (`tool_version` if not found),
+                `options` should be the options the workspace was built with (see VivadoSTA.database_options).
+            Return the number of entries imported.
+        """
+        count = 0
+        for vhdl_hash in sorted(os.listdir(workspace_path)):
+            directory = os.path.join(workspace_path, vhdl_hash)
+            report_path = os.path.join(directory, VivadoSTA.REPORT_FILENAME)
+            tcl_script_path = os.path.join(directory, VivadoSTA.TCL_SCRIPT_NAME)
+            if not os.path.isfile(report_path) or not os.path.isfile(tcl_script_path):
+                continue
+            
+            with open(tcl_script_path, "r") as f:
+                match = re.search(r"-part\s+(\S+)", f.read())
+            if match is None:
+                continue
+            part = match.group(1)
+            
+            version = tool_version
+            log_path = os.path.join(directory, "vivado.log")
+            if os.path.isfile(log_path):
+                with open(log_path, "r", errors = "ignore") as f:
+                    match = re.search(r"Vivado (v\S+)", f.read())
+                if match is not None:
+                    version = match.group(1)
+            
+            with open(report_path, "r") as f:
+                report = VivadoSTA.TimingReport.parse_lines(f.readlines())
+            self.put(vhdl_hash, part, version, options, report)
+            count += 1
+        
+        print(f"[INFO] {count} module(s) imported from \"{workspace_path}\"")
+        return count
+
+
+def _kill_process_tree(process: subprocess.Popen):
+    """
+        Kill the process and its children (Vivado launches its own child processes), see _run_script().
+    """
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)], stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+    else:
+        try:
+            os.killpg(process.pid, signal.SIGKILL) # started in a new session, pgid == pid
+        except ProcessLookupError:
+            pass
+
+
+class STAJobScheduler:
+    """
+        Runs STA jobs in `workers` threads, the ones with larger priority first.
+        A job is fn(*args, cancel_event); it fails if it raises or returns None, and is retried at most `retries` more times.
+        `progress_callback(done, total, eta)` is called after each finished job, eta (seconds) extrapolated from the elapsed time.
+        cancel() (from any thread) stops scheduling new jobs; running jobs should watch `cancel_event` and stop cooperatively.
+        `cancel_event`: shared with the caller (e.g. one per analysis), a new one by default.
+    """
+    def __init__(self, workers: int = 12, retries: int = 1, progress_callback: callable = None, cancel_event: threading.Event = None):
+        self.workers = workers
+        self.retries = retries
+        self.progress_callback = progress_callback
+        self.cancel_event = cancel_event if cancel_event is not None else threading.Event()
+        
+        self._jobs: List[Tuple[float, int, str, callable, tuple]] = [] # heap of (-priority, seq, job_id, fn, args)
+    
+    def submit(self, job_id: str, fn: callable, args: tuple = (), priority: float = 0.0):
+        heapq.heappush(self._jobs, (-priority, len(self._jobs), job_id, fn, args))
+    
+    def cancel(self):
+        self.cancel_event.set()
+    
+    def run(self) -> Dict[str, object]:
+        """
+            Run all the submitted jobs, return {job_id: result}.
+            Raise STAException if cancelled or any job still fails after the retries.
+        """
+        total, done, start_time = len(self._jobs), 0, time.time()
+        results: Dict[str, object] = {}
+        errors: Dict[str, str] = {}
+        lock = threading.Lock()
+        
+        def _worker():
+            nonlocal done
+            while True:
+                with lock:
+                    if not self._jobs or self.cancel_event.is_set():
+                        return
+                    _, _, job_id, fn, args = heapq.heappop(self._jobs)
+                
+                result, error = None, None
+                for attempt in range(self.retries + 1):
+                    if self.cancel_event.is_set():
+                        error = "cancelled"
+                        break
+                    try:
+                        result, error = fn(*args, self.cancel_event), None
+                    except Exception as e:
+                        result, error = None, f"{type(e).__name__}: {e}"
+                    if result is not None:
+                        break
+                    error = error or "no result"
+                    print(f"[ERROR] job {job_id} failed (attempt {attempt + 1} / {self.retries + 1}): {error}")
+                
+                with lock:
+                    if result is not None:
+                        results[job_id] = result
+                    else:
+                        errors[job_id] = error
+                    done += 1
+                    eta = (time.time() - start_time) / done * (total - done)
+                    if self.progress_callback is not None:
+                        self.progress_callback(done, total, eta)
+                    else:
+                        print(f"[INFO] {done} / {total} STA job(s) finished, ETA {eta:.0f} s")
+        
+        threads = [threading.Thread(target = _worker, daemon = True) for _ in range(max(1, min(self.workers, total)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        if self.cancel_event.is_set():
+            raise STAException("Static timing analysis cancelled")
+        if errors:
+            failed = [f"{job_id} ({error})" for job_id, error in errors.items()]
+            raise STAException(f"{len(errors)} STA job(s) failed: " + ", ".join(failed[:5]) + (f", ... ({len(failed) - 5} more)" if len(failed) > 5 else ""))
+        return results
+
+
 class VivadoSTA(StaticTimingAnalyser):
     """
         Static timing analyser powered by Vivado TCL tools.
@@ -51,6 +300,16 @@ class VivadoSTA(StaticTimingAnalyser):
                 res += "    " + str(row) + ",\n"
             return res[:-2] + "\n]>\n"
         
+        def to_dict(self) -> Dict:
+            return dict(vars(self))
+        
+        @staticmethod
+        def from_dict(d: Dict):
+            res = VivadoSTA.TimingPath()
+            res.__dict__.update(d)
+            res.details = [dict(row, netlist_resources = [tuple(nr) for nr in row["netlist_resources"]]) for row in d["details"]]
+            return res
+        
         @staticmethod
         def parse_lines(lines: List[str]):
             """
@@ -165,6 +424,15 @@ class VivadoSTA(StaticTimingAnalyser):
             self.design_state: str = None
             
             self.paths: List[VivadoSTA.TimingPath] = []
+        
+        def to_json(self) -> str:
+            return json.dumps([path.to_dict() for path in self.paths])
+        
+        @staticmethod
+        def from_json(s: str):
+            res = VivadoSTA.TimingReport()
+            res.paths = [VivadoSTA.TimingPath.from_dict(d) for d in json.loads(s)]
+            return res
 
         @staticmethod
         def parse_lines(lines: List[str]):
@@ -185,18 +453,56 @@ class VivadoSTA(StaticTimingAnalyser):
             
             return res
     
-    def __init__(self, part_name: str = "xc7a200tfbg484-1", temporary_workspace_path: str = ".vivado_sta", vivado_executable_path: str = "vivado", pool_size = 12, syn_max_threads = 8):
+    TMP_TOP_MODULE_NAME = "module"
+    TMP_SRC_DIR = "src"
+    TCL_SCRIPT_NAME = "build_and_timing.tcl"
+    REPORT_FILENAME = "timing_report.txt"
+    SUMMARY_FILENAME = "timing_summary.txt"
+    SYNTH_OPTIONS = "-mode out_of_context -flatten_hierarchy none"
+    PORT_TIMING_OPTION = "-port_to_port" # appended to the options in the database key if port-to-port paths are reported
+    
+    def __init__(self, part_name: str = "xc7a200tfbg484-1", temporary_workspace_path: str = ".vivado_sta", vivado_executable_path: str = "vivado", pool_size = 12, syn_max_threads = 8, database: TimingDatabase = None, tool_version: str = None, batch_size: int = 1, port_timing: bool = True, fold_constants: bool = False, job_timeout: float = None, retries: int = 1, progress_callback: callable = None):
+        """
+            `batch_size`: max number of modules analysed in one Vivado session (see _analyse_batch()), 1 for a session per module.
+            `port_timing`: also report the worst path of each input -> output port pair in the same session,
+                and fill timing_info[(in_port, out_port)] besides timing_info[("_simple_in", "_simple_out")].
+            `fold_constants`: analyse each instance in its context, with the inputs driven by constant operators (e.g. from Constants)
+                folded into the module before hashing, so that e.g. `x * 0.1` gets its own delay; equal contexts share one analysis.
+            `database`: where the reports are cached (TimingDatabase() at the default path if None).
+            `tool_version`: version of the Vivado, detected by `vivado -version` at the first use if None.
+            `job_timeout`: wall-clock limit (seconds) of a Vivado run per module (times the number of modules for a batch), the process tree is killed beyond it.
+            `retries`, `progress_callback`: see STAJobScheduler; the jobs are scheduled largest (VHDL size) first.
+        """
         self.part_name = part_name
         self.temporary_workspace_path = os.path.abspath(temporary_workspace_path)
         self.vivado_executable_path = vivado_executable_path
         self.pool_size = pool_size
         self.syn_max_threads = syn_max_threads
+        self.database = database if database is not None else TimingDatabase()
+        self.batch_size = batch_size
+        self.port_timing = port_timing
+        self.fold_constants = fold_constants
+        self.job_timeout = job_timeout
+        self.retries = retries
+        self.progress_callback = progress_callback
         
-        self.TMP_TOP_MODULE_NAME = "module"
-        self.TMP_SRC_DIR = "src"
-        self.TCL_SCRIPT_NAME = "build_and_timing.tcl"
-        self.REPORT_FILENAME = "timing_report.txt"
-        self.SUMMARY_FILENAME = "timing_summary.txt"
+        self._cancel_events: List[threading.Event] = [] # of the running analyses
+        self._cancel_events_lock = threading.Lock()
+        
+        self._tool_version = tool_version
+        self._tool_version_lock = threading.Lock()
+    
+    @property
+    def tool_version(self) -> str:
+        with self._tool_version_lock:
+            if self._tool_version is None:
+                try:
+                    outs = subprocess.run([self.vivado_executable_path, "-version"], stdout = subprocess.PIPE, stderr = subprocess.PIPE, text = True).stdout
+                    match = re.search(r"Vivado (v\S+)", outs)
+                    self._tool_version = match.group(1) if match is not None else "unknown"
+                except OSError:
+                    self._tool_version = "unknown"
+        return self._tool_version
     
     def _create_temporary_workspace(self):
         if os.path.exists(self.temporary_workspace_path):
@@ -204,143 +510,799 @@ class VivadoSTA(StaticTimingAnalyser):
             # shutil.rmtree(self.temporary_workspace_path)
         os.makedirs(self.temporary_workspace_path, exist_ok = True)
     
-    def _analyse_single(self, vhdl: dict, key: str):
-        # emitting files
-        emit_to_files(vhdl, os.path.join(self.temporary_workspace_path, key, self.TMP_SRC_DIR)) # TODO 重复的 types.vhd 等
-        
-        # write script
+    def _module_vhdl(self, subs: Structure, runtime_id: RuntimeId, context: Dict[str, str] = None):
+        """
+            VHDL files of the substructure as the top module, and its key (hash) for the workspace.
+            `context`: {input port: VHDL literal}, the inputs turned into constant signals of the module (see constant_context()).
+        """
+        model = subs.generation(runtime_id, top_module_name = self.TMP_TOP_MODULE_NAME)
+        if context:
+            model = copy.copy(model) # the model of a reusable structure is shared, do not touch it
+            model.ports = {name: port for name, port in model.ports.items() if name not in context}
+            ports = dict(subs.ports_inside_flipped.nodes())
+            model.signals = {**model.signals, **{name: ports[name].get_type(runtime_id) for name in context}}
+            model.assignments = model.assignments + list(context.items())
+        vhdl = model.emit_vhdl()
+        key = hashlib.sha256(vhdl[f"hdl_{self.TMP_TOP_MODULE_NAME}.vhd"].encode('utf-8')).hexdigest()
+        return vhdl, key
+    
+    @staticmethod
+    def structure_key(subs: Structure, runtime_id: RuntimeId) -> tuple:
+        """
+            Key of the HDL the (operator) substructure generates, without generating it. Only valid in the current process.
+            Reusable structures are identified by unique_name; for the others (duplicated with new names),
+                the generation function, the custom params and the runtime types and latencies of the ports are used.
+        """
+        if subs.is_reusable:
+            return ("reusable", subs.unique_name)
+        ports = tuple((name, port.get_type(runtime_id).uid, port.latency) for name, port in subs.ports_inside_flipped.nodes())
+        return ("structural", id(subs.custom_generation), repr(subs.custom_params), ports)
+    
+    @property
+    def database_options(self) -> str:
+        return VivadoSTA.SYNTH_OPTIONS + (" " + VivadoSTA.PORT_TIMING_OPTION if self.port_timing else "")
+    
+    @staticmethod
+    def module_ports(subs: Structure, context: Dict[str, str] = None) -> Tuple[List[str], List[str]]:
+        """
+            Names of the input and output ports of the module generated from `subs` (i.e. the layered names), w/o the ones folded in `context`.
+        """
+        in_ports = [name for name, _ in subs.ports_inside_flipped.nodes(filter = "in", flipped = True) if not context or name not in context]
+        out_ports = [name for name, _ in subs.ports_inside_flipped.nodes(filter = "out", flipped = True)]
+        return in_ports, out_ports
+    
+    @staticmethod
+    def constant_outputs(subs: Structure) -> Dict[str, str]:
+        """
+            {output port: VHDL literal} if `subs` is a constant operator (no inputs, every output assigned a literal, e.g. the core of Constants), else None.
+        """
+        if len(subs.ports_inside_flipped.nodes(filter = "in", flipped = True)) > 0 or "arch_body" not in subs.custom_params:
+            return None
+        literals = dict(re.findall(r"^\s*(\w+)\s*<=\s*(\"[01]*\"|'[01]')\s*;\s*$", subs.custom_params["arch_body"], re.M))
+        out_ports = [name for name, _ in subs.ports_inside_flipped.nodes(filter = "out", flipped = True)]
+        if len(out_ports) == 0 or any(name not in literals for name in out_ports):
+            return None
+        return {name: literals[name] for name in out_ports}
+    
+    @staticmethod
+    def constant_context(s: Structure, subs_inst_name: str, constants: Dict[str, Dict[str, str]]) -> Dict[str, str]:
+        """
+            {input port: VHDL literal} of the inputs of the substructure directly (w/o latency) driven by the constant operators,
+                `constants` is {inst_name: constant_outputs(...)} of the constant operators in `s`.
+        """
+        context = {}
+        for name, port in s.get_subs_ports_outside(subs_inst_name).nodes(filter = "in"):
+            if not port.located_net.has_driver:
+                continue
+            driver = port.located_net.driver()
+            if driver.of_structure_inst_name in constants and driver.latency + port.latency == 0:
+                context[name] = constants[driver.of_structure_inst_name][driver.layered_name]
+        return context
+    
+    def load_cached_report(self, key: str):
+        """
+            The timing report of the module with `key` in the database (for this part, tool version and options), or None. Vivado is not run.
+        """
+        return self.database.get(key, self.part_name, self.tool_version, self.database_options)
+    
+    @staticmethod
+    def report_delay(report: 'VivadoSTA.TimingReport') -> float:
+        """
+            The max delay among the paths in the report.
+            [NOTICE] e.g. (右侧的 "<-- x" 是 path_report.details 的索引)
+            
+                Location             Delay type                Incr(ns)  Path(ns)    Netlist Resource(s)
+            -------------------------------------------------------------------    -------------------
+                                                                0.000     0.000 r  b[0] (IN)                <-- 0
+                                    net (fo=3, unset)            0.973     0.973    b[0]                    <-- 1
+                                    LUT4 (Prop_lut4_I3_O)        0.124     1.097 r  r[3]_INST_0_i_1/O       <-- 2
+                                    net (fo=1, unplaced)         1.111     2.208    r[3]_INST_0_i_1_n_0     <-- 3
+                                    LUT5 (Prop_lut5_I0_O)        0.124     2.332 r  r[3]_INST_0/O           <-- 4
+                                    net (fo=0)                   0.973     3.305    r[3]                    <-- 5
+                                                                                r  r[3] (OUT)
+            -------------------------------------------------------------------    -------------------
+                这里如果是纯 net, 条目不会超过三条;
+                如果有器件, 则有第一条 (IN), 第二条入口 net, 倒数第一条出口 net + (OUT).
+                    后者延迟取倒数第二条 (4, i.e. -2) 的 path_ns (2.332) 减去第二条 (1) 的 path_ns (0.973), 为 1.359.
+            
+            TODO PnR 以获得更准确的 net 延迟, 加的话除了这里, TimingPath 解析也要修改 (Location)
+        """
+        max_delay = 0.0
+        for path_report in report.paths:
+            if len(path_report.details) > 3:
+                delay = path_report.details[-2]["path_ns"] - path_report.details[1]["path_ns"]
+                max_delay = max(delay, max_delay)
+        return max_delay
+    
+    @staticmethod
+    def report_port_delays(report: 'VivadoSTA.TimingReport') -> Dict[Tuple[str, str], float]:
         """
+            The max delay of each (source port, destination port) pair among the port-to-port paths in the report,
+                delays counted as in report_delay() (0.0 for pure nets); bit indices are stripped, names in lower case.
+        """
+        port_delays: Dict[Tuple[str, str], float] = {}
+        for path_report in report.paths:
+            if path_report.source is None or path_report.destination is None or len(path_report.details) == 0:
+                continue
+            if not path_report.details[0]["netlist_resources"] or not path_report.details[0]["netlist_resources"][0][1].endswith("(IN)"):
+                continue # not from an input port
+            source = re.sub(r"\[\d+\]$", "", path_report.source.split()[0]).lower()
+            destination = re.sub(r"\[\d+\]$", "", path_report.destination.split()[0]).lower()
+            delay = path_report.details[-2]["path_ns"] - path_report.details[1]["path_ns"] if len(path_report.details) > 3 else 0.0
+            port_delays[(source, destination)] = max(delay, port_delays.get((source, destination), 0.0))
+        return port_delays
+    
+    def _module_tcl(self, vhdl: dict, ports: Tuple[List[str], List[str]], prefix: str = "") -> str:
+        """
+            TCL commands to synthesize and report the module, with its files under `prefix` (relative to the working directory).
+            With port_timing, the worst path of each port pair (if any) is appended to the report, see report_port_delays().
             references:
                 https://docs.amd.com/r/en-US/ug835-vivado-tcl-commands/
                 https://github.com/JulianKemmerer/PipelineC/blob/master/src/VIVADO.py
         """
-        tcl_script_str = textwrap.dedent(f"""\
-            ### auto generated by nodalhdl ###
-            
-            read_vhdl -library work {{ {" ".join([self.TMP_SRC_DIR + "/" + filename for filename in vhdl.keys()])} }}
-            
-            set_param general.maxThreads {self.syn_max_threads}
+        return textwrap.dedent(f"""\
+            read_vhdl -library work {{ {" ".join([prefix + self.TMP_SRC_DIR + "/" + filename for filename in vhdl.keys()])} }}
             
             synth_design \\
                 -part {self.part_name} \\
-                -mode out_of_context \\
                 -top {self.TMP_TOP_MODULE_NAME} \\
-                -flatten_hierarchy none
+                {VivadoSTA.SYNTH_OPTIONS}
             
             report_timing \\
                 -setup \\
                 -no_header \\
                 -column_style variable_width \\
-                -file {self.REPORT_FILENAME}
-        """)
-        tcl_script_path = os.path.join(self.temporary_workspace_path, key, self.TCL_SCRIPT_NAME)
-        with open(tcl_script_path, "w") as f:
+                -file {prefix + self.REPORT_FILENAME}
+        """) + ("".join([self._port_pair_tcl(in_port, out_port, prefix) for in_port in ports[0] for out_port in ports[1]]) if self.port_timing else "")
+    
+    def _port_pair_tcl(self, in_port: str, out_port: str, prefix: str = "") -> str:
+        return (
+            "\n" +
+            f"# {in_port} -> {out_port}\n" +
+            "catch {\n" +
+            f"    set paths [get_timing_paths -quiet -setup -from [get_ports -quiet {{{in_port} {in_port}[*]}}] -to [get_ports -quiet {{{out_port} {out_port}[*]}}]]\n" +
+            "    if {[llength $paths] > 0} {\n" +
+            f"        report_timing -of_objects $paths -no_header -column_style variable_width -file {prefix + self.REPORT_FILENAME} -append\n" +
+            "    }\n" +
+            "}\n"
+        )
+    
+    def _prepare_module(self, vhdl: dict, key: str, ports: Tuple[List[str], List[str]]):
+        """
+            Emit the files and the (standalone) script of the module into its workspace, and remove the stale report.
+        """
+        emit_to_files(vhdl, os.path.join(self.temporary_workspace_path, key, self.TMP_SRC_DIR)) # TODO 重复的 types.vhd 等
+        
+        tcl_script_str = "### auto generated by nodalhdl ###\n\n" + f"set_param general.maxThreads {self.syn_max_threads}\n\n" + self._module_tcl(vhdl, ports)
+        with open(os.path.join(self.temporary_workspace_path, key, self.TCL_SCRIPT_NAME), "w") as f:
             f.write(tcl_script_str)
         
-        # run script
         report_path = os.path.join(self.temporary_workspace_path, key, self.REPORT_FILENAME)
-        if not os.path.exists(report_path):
-            process = subprocess.Popen(
-                [self.vivado_executable_path, "-mode", "batch", "-source", self.TCL_SCRIPT_NAME],
-                cwd = os.path.join(self.temporary_workspace_path, key),
-                stdout = subprocess.PIPE,
-                stderr = subprocess.PIPE,
-                text = True
-            )
-            # process.wait() # [NOTICE] 有点诡异, 用 .wait() 综合会到一半卡住; 用 .communicate() 也能等待到执行完
-            outs, errs = process.communicate()
-            
-            if process.returncode != 0:
-                print(f"[ERROR] failed in running the script")
-        else:
-            print(f"[INFO] module analysed, skipped (hash: {key})")
+        if os.path.exists(report_path): # stale report of another part or tool version
+            os.remove(report_path)
+    
+    def _run_script(self, cwd: str, timeout: float = None, cancel_event: threading.Event = None):
+        """
+            Run the script in `cwd`, killing the process tree if `timeout` (seconds) is exceeded or `cancel_event` is set.
+        """
+        process = subprocess.Popen(
+            [self.vivado_executable_path, "-mode", "batch", "-source", self.TCL_SCRIPT_NAME],
+            cwd = cwd,
+            stdout = subprocess.PIPE,
+            stderr = subprocess.PIPE,
+            text = True,
+            start_new_session = os.name != "nt", # own process group, see _kill_process_tree()
+            creationflags = subprocess.CREATE_NEW_PROCESS_GROUP if os.name == "nt" else 0
+        )
+        # process.wait() # [NOTICE] 有点诡异, 用 .wait() 综合会到一半卡住; 用 .communicate() 也能等待到执行完
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            try:
+                outs, errs = process.communicate(timeout = 1.0) # poll
+                break
+            except subprocess.TimeoutExpired:
+                if cancel_event is not None and cancel_event.is_set():
+                    print(f"[INFO] cancelled, killing the script in \"{cwd}\"")
+                elif deadline is not None and time.time() > deadline:
+                    print(f"[ERROR] timeout ({timeout} s), killing the script in \"{cwd}\"")
+                else:
+                    continue
+                _kill_process_tree(process)
+                process.communicate()
+                return
         
-        # load and parse the report
+        if process.returncode != 0:
+            print(f"[ERROR] failed in running the script")
+    
+    def _collect_report(self, key: str):
+        """
+            Parse the report generated in the workspace of the module and put it into the database. None if not generated.
+        """
+        report_path = os.path.join(self.temporary_workspace_path, key, self.REPORT_FILENAME)
         if not os.path.exists(report_path):
             print(f"[ERROR] timing report not generated, check \"{report_path}\"")
-            raise Exception("timing report not generated") # TODO
+            return None
         with open(report_path, "r") as f:
-            report_lines = f.readlines()
-        report = VivadoSTA.TimingReport.parse_lines(report_lines)
+            report = VivadoSTA.TimingReport.parse_lines(f.readlines())
+        
+        self.database.put(key, self.part_name, self.tool_version, self.database_options, report)
         
         return report
     
-    def analyse(self, s: Structure, root_runtime_id: RuntimeId):
+    def _analyse_single(self, vhdl: dict, key: str, ports: Tuple[List[str], List[str]], cancel_event: threading.Event = None):
+        # cached
+        report = self.load_cached_report(key)
+        if report is not None:
+            print(f"[INFO] module analysed, skipped (hash: {key})")
+            return report
+        
+        # emit, run and collect
+        self._prepare_module(vhdl, key, ports)
+        self._run_script(os.path.join(self.temporary_workspace_path, key), self.job_timeout, cancel_event)
+        report = self._collect_report(key)
+        if report is None:
+            raise STAException("timing report not generated")
+        
+        return report
+    
+    def _analyse_batch(self, modules: List[Tuple[dict, str, Tuple[List[str], List[str]]]], cancel_event: threading.Event = None) -> Dict[str, 'VivadoSTA.TimingReport']:
         """
-            refactorized with multiprocessing, inspired by PipelineC
+            Analyse the modules [(vhdl, key, ports), ...] in sequence within one Vivado session, to pay the startup (and part loading) only once.
+            Failures are isolated per module, the ones already in the database (e.g. done by a previous attempt) are skipped.
+            Return {key: report}, raise STAException if any report is not generated.
         """
-        assert s.is_flattened
+        reports = {key: self.load_cached_report(key) for _, key, _ in modules}
+        modules = [(vhdl, key, ports) for vhdl, key, ports in modules if reports[key] is None]
+        if not modules:
+            return reports
         
-        # create workspace
-        self._create_temporary_workspace()
+        keys = [key for _, key, _ in modules]
+        batch_name = "batch_" + hashlib.sha256(" ".join(keys).encode('utf-8')).hexdigest()[:16]
+        batch_path = os.path.join(self.temporary_workspace_path, batch_name)
+        os.makedirs(batch_path, exist_ok = True)
+        
+        tcl_script_str = "### auto generated by nodalhdl ###\n\n" + f"set_param general.maxThreads {self.syn_max_threads}\n"
+        for idx, (vhdl, key, ports) in enumerate(modules):
+            self._prepare_module(vhdl, key, ports)
+            tcl_script_str += f"\n# module {idx + 1} / {len(modules)} (hash: {key})\n"
+            tcl_script_str += "if {[catch {\n" + textwrap.indent(self._module_tcl(vhdl, ports, prefix = f"../{key}/"), "    ") + "} err]} {\n    puts \"ERROR: $err\"\n}\n"
+            tcl_script_str += "catch {close_design}\ncatch {remove_files [get_files]}\n"
+        with open(os.path.join(batch_path, self.TCL_SCRIPT_NAME), "w") as f:
+            f.write(tcl_script_str)
+        
+        print(f"[INFO] analysing {len(modules)} module(s) in {batch_name}")
+        self._run_script(batch_path, self.job_timeout * len(modules) if self.job_timeout is not None else None, cancel_event)
         
-        # collect and analyse reusable structures
+        reports.update({key: self._collect_report(key) for key in keys})
+        missing = [key for key in keys if reports[key] is None]
+        if missing:
+            raise STAException(f"timing report(s) of {len(missing)} module(s) not generated in {batch_name}")
+        return reports
+    
+    def cancel(self):
+        """
+            Cancel the running analyses (from another thread), analyse() raises STAException.
+        """
+        with self._cancel_events_lock:
+            for cancel_event in self._cancel_events:
+                cancel_event.set()
+    
+    @staticmethod
+    def _module_size(module: Tuple[dict, str, Tuple[List[str], List[str]]]) -> int:
+        return sum(len(content) for content in module[0].values()) # VHDL size, as the priority
+    
+    def _collect_modules(self, s: Structure, root_runtime_id: RuntimeId, cancel_event: threading.Event = None):
+        """
+            Collect the unique modules of the substructures of `s` (flattened).
+            Return {key: [subs_inst_name(s)]}, {key: report} of the cached ones and [(vhdl, key, ports), ...] of the uncached ones.
+            Raise STAException once `cancel_event` is set.
+        """
         structures_on_analysing: Dict[str, List[str]] = {} # {key: [subs_inst_name(s)]}
-            # TODO 这里存 subs_inst_name 是因为理论上同结构的不同实例因为所处连接关系的不同 (例如有常数输入), 时序信息也可能不同; 下面暂时没有考虑这一点, 但数据结构在此保留.
-        analyse_pool: multiprocessing.pool.ThreadPool = multiprocessing.pool.ThreadPool(self.pool_size)
-        results_on_analysing: Dict[str, multiprocessing.pool.AsyncResult] = {}
+            # 同结构的不同实例可能因为所处连接关系的不同 (例如有常数输入) 而时序信息不同, 开启 fold_constants 时常数输入会被折叠进 key (见 constant_context()).
+        reports: Dict[str, VivadoSTA.TimingReport] = {} # {key: report}
+        modules_to_analyse: List[Tuple[dict, str, Tuple[List[str], List[str]]]] = [] # [(vhdl, key, ports)], uncached ones
+        keys_by_structure: Dict[tuple, str] = {} # {structure_key: key}
+        constants: Dict[str, Dict[str, str]] = {} # {inst_name: {output port: literal}}, fold_constants only
+        if self.fold_constants:
+            for subs_inst_name, subs in s.substructures.items():
+                outputs = VivadoSTA.constant_outputs(subs)
+                if outputs is not None:
+                    constants[subs_inst_name] = outputs
         for idx, (subs_inst_name, subs) in enumerate(s.substructures.items()):
+            if cancel_event is not None and cancel_event.is_set():
+                raise STAException("Static timing analysis cancelled")
+            
             # filtering
             if len(subs.ports_inside_flipped.nodes(filter = "in", flipped = True)) == 0: # no input
                 continue
             if len(subs.ports_inside_flipped.nodes(filter = "out", flipped = True)) == 0: # no output
                 continue
             
-            # calculate hash
-            model = subs.generation(root_runtime_id.next(subs_inst_name), top_module_name = self.TMP_TOP_MODULE_NAME)
-            vhdl = model.emit_vhdl()
-            file_hash = hashlib.sha256(vhdl[f"hdl_{self.TMP_TOP_MODULE_NAME}.vhd"].encode('utf-8')).hexdigest()
+            # calculate hash, generating HDL only once per structure key (and context)
+            context = VivadoSTA.constant_context(s, subs_inst_name, constants) if constants else {}
+            structure_key = (VivadoSTA.structure_key(subs, root_runtime_id.next(subs_inst_name)), tuple(sorted(context.items())))
+            key = keys_by_structure.get(structure_key, None)
+            vhdl = None
+            if key is None:
+                vhdl, key = self._module_vhdl(subs, root_runtime_id.next(subs_inst_name), context)
+                keys_by_structure[structure_key] = key
             
-            # collect unique structures and analyse
-            key = file_hash
+            # collect unique structures
             if structures_on_analysing.get(key, None) is None: # first time
                 # save structure ref
                 structures_on_analysing[key] = []
                 
-                # async analysis
-                print(f"[INFO] analysing module {len(structures_on_analysing)} (hash: {key}, ref_inst_name: {subs_inst_name})")
-                results_on_analysing[key] = analyse_pool.apply_async(self._analyse_single, (vhdl, key))
+                report = self.load_cached_report(key)
+                if report is not None:
+                    print(f"[INFO] module {len(structures_on_analysing)} analysed, skipped (hash: {key}, ref_inst_name: {subs_inst_name})")
+                    reports[key] = report
+                else:
+                    print(f"[INFO] module {len(structures_on_analysing)} to be analysed (hash: {key}, ref_inst_name: {subs_inst_name})")
+                    modules_to_analyse.append((vhdl, key, VivadoSTA.module_ports(subs, context)))
             
             structures_on_analysing[key].append(subs_inst_name)
         
-        # fetch the results
-        for idx, (key, subs_inst_names) in enumerate(structures_on_analysing.items()):
-            print(f"[INFO] waiting on analysis results for module {idx + 1} / {len(structures_on_analysing.items())} (hash: {key})")
-            report: VivadoSTA.TimingReport = results_on_analysing[key].get() # [NOTICE] add timeout and poll?
+        return structures_on_analysing, reports, modules_to_analyse
+    
+    def _assign_timing(self, s: Structure, root_runtime_id: RuntimeId, subs_inst_names: List[str], report: 'VivadoSTA.TimingReport'):
+        """
+            Calculate delay(s) from the report and assign timing_info(s), the max one and the port-to-port ones.
+        """
+        max_delay = VivadoSTA.report_delay(report)
+        port_delays = VivadoSTA.report_port_delays(report) if self.port_timing else {}
+        
+        for subs_inst_name in subs_inst_names:
+            subs = s.substructures[subs_inst_name]
+            runtime = subs.get_runtime(root_runtime_id.next(subs_inst_name))
+            runtime.timing_info.clear() # no stale port pairs of previous analyses
+            runtime.timing_info[("_simple_in", "_simple_out")] = max_delay
+            in_ports, out_ports = VivadoSTA.module_ports(subs)
+            for in_port in in_ports:
+                for out_port in out_ports:
+                    delay = port_delays.get((in_port.lower(), out_port.lower()), None)
+                    if delay is not None:
+                        runtime.timing_info[(in_port, out_port)] = delay
+    
+    def analyse(self, s: Structure, root_runtime_id: RuntimeId):
+        """
+            refactorized with multiprocessing, inspired by PipelineC
+            The uncached modules are analysed by a STAJobScheduler, largest first, with timeouts and retries (see __init__()).
+            With batch_size > 1, they are analysed in batches of (at most) batch_size per Vivado session.
+        """
+        assert s.is_flattened
+        
+        cancel_event = threading.Event() # of this analysis, see cancel()
+        with self._cancel_events_lock:
+            self._cancel_events.append(cancel_event)
+        try:
+            # create workspace
+            self._create_temporary_workspace()
             
-            # calculate delay(s) and assign timing_info(s) TODO 端口级完整延迟模型, 重构后这里暂只分析最大值
-            max_delay = 0.0
-            for path_report in report.paths:
-                """
-                    [NOTICE] e.g. (右侧的 "<-- x" 是 path_report.details 的索引)
-                    
-                        Location             Delay type                Incr(ns)  Path(ns)    Netlist Resource(s)
-                    -------------------------------------------------------------------    -------------------
-                                                                        0.000     0.000 r  b[0] (IN)                <-- 0
-                                            net (fo=3, unset)            0.973     0.973    b[0]                    <-- 1
-                                            LUT4 (Prop_lut4_I3_O)        0.124     1.097 r  r[3]_INST_0_i_1/O       <-- 2
-                                            net (fo=1, unplaced)         1.111     2.208    r[3]_INST_0_i_1_n_0     <-- 3
-                                            LUT5 (Prop_lut5_I0_O)        0.124     2.332 r  r[3]_INST_0/O           <-- 4
-                                            net (fo=0)                   0.973     3.305    r[3]                    <-- 5
-                                                                                        r  r[3] (OUT)
-                    -------------------------------------------------------------------    -------------------
-                        这里如果是纯 net, 条目不会超过三条;
-                        如果有器件, 则有第一条 (IN), 第二条入口 net, 倒数第一条出口 net + (OUT).
-                            后者延迟取倒数第二条 (4, i.e. -2) 的 path_ns (2.332) 减去第二条 (1) 的 path_ns (0.973), 为 1.359.
-                    
-                    TODO PnR 以获得更准确的 net 延迟, 加的话除了这里, TimingPath 解析也要修改 (Location)
-                """
-                if len(path_report.details) > 3:
-                    delay = path_report.details[-2]["path_ns"] - path_report.details[1]["path_ns"]
-                    max_delay = max(delay, max_delay)
+            # collect reusable structures
+            structures_on_analysing, reports, modules_to_analyse = self._collect_modules(s, root_runtime_id, cancel_event)
+            
+            # schedule the jobs, largest first
+            scheduler = STAJobScheduler(self.pool_size, self.retries, self.progress_callback, cancel_event)
+            if self.batch_size <= 1:
+                for module in modules_to_analyse:
+                    scheduler.submit(module[1], self._analyse_single, module, priority = VivadoSTA._module_size(module))
+            elif modules_to_analyse:
+                # spread over the pool, sizes balanced
+                modules_to_analyse.sort(key = VivadoSTA._module_size, reverse = True)
+                batch_number = max(math.ceil(len(modules_to_analyse) / self.batch_size), min(self.pool_size, len(modules_to_analyse)))
+                for batch_idx in range(batch_number):
+                    batch = modules_to_analyse[batch_idx::batch_number]
+                    scheduler.submit(f"batch {batch_idx + 1} / {batch_number}", self._analyse_batch, (batch, ), priority = sum(VivadoSTA._module_size(module) for module in batch))
             
-            for subs_inst_name in subs_inst_names:
-                runtime = s.substructures[subs_inst_name].get_runtime(root_runtime_id.next(subs_inst_name))
-                runtime.timing_info[("_simple_in", "_simple_out")] = max_delay
+            # run and fetch the results
+            results = scheduler.run()
+        finally:
+            with self._cancel_events_lock:
+                self._cancel_events.remove(cancel_event)
+        for job_id, result in results.items():
+            reports.update(result if isinstance(result, dict) else {job_id: result}) # {key: report} of a batch, or report of a single (job_id is the key)
+        
+        # assign timing_info(s)
+        for key, subs_inst_names in structures_on_analysing.items():
+            self._assign_timing(s, root_runtime_id, subs_inst_names, reports[key])
+        
+        print(f"[INFO] static timing analysis finished")
+    
+    async def _analyse_single_async(self, vhdl: dict, key: str, ports: Tuple[List[str], List[str]]):
+        """
+            _analyse_single() on asyncio, the process tree is killed on timeout or when the task is cancelled.
+        """
+        await asyncio.to_thread(self._prepare_module, vhdl, key, ports)
+        
+        process = await asyncio.create_subprocess_exec(
+            self.vivado_executable_path, "-mode", "batch", "-source", self.TCL_SCRIPT_NAME,
+            cwd = os.path.join(self.temporary_workspace_path, key),
+            stdout = asyncio.subprocess.PIPE,
+            stderr = asyncio.subprocess.PIPE,
+            start_new_session = os.name != "nt", # own process group, see _kill_process_tree()
+            creationflags = subprocess.CREATE_NEW_PROCESS_GROUP if os.name == "nt" else 0
+        )
+        try:
+            await asyncio.wait_for(process.communicate(), timeout = self.job_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if isinstance(e, asyncio.TimeoutError):
+                print(f"[ERROR] timeout ({self.job_timeout} s), killing the script of module {key}")
+            _kill_process_tree(process)
+            await process.wait()
+            raise
+        
+        if process.returncode != 0:
+            print(f"[ERROR] failed in running the script")
+        
+        report = await asyncio.to_thread(self._collect_report, key)
+        if report is None:
+            raise STAException("timing report not generated")
+        return report
+    
+    async def analyse_async(self, s: Structure, root_runtime_id: RuntimeId):
+        """
+            Async iterator version of analyse(), for asyncio-based callers:
+                async for key, subs_inst_names, report in sta.analyse_async(s, rid): ...
+            Each unique module is yielded (cached ones first) once its report is ready and timing_info of its instances is assigned.
+            At most pool_size Vivado processes run at the same time, largest first, with job_timeout and retries as in analyse();
+                batch_size is not used (a session per module). Closing the iterator or cancelling the task kills the running processes.
+        """
+        assert s.is_flattened
+        
+        # create workspace and collect reusable structures
+        self._create_temporary_workspace()
+        cancel_event = threading.Event()
+        try:
+            structures_on_analysing, reports, modules_to_analyse = await asyncio.to_thread(self._collect_modules, s, root_runtime_id, cancel_event)
+        except asyncio.CancelledError:
+            cancel_event.set() # stop the collecting thread
+            raise
+        
+        for key, report in reports.items():
+            self._assign_timing(s, root_runtime_id, structures_on_analysing[key], report)
+            yield key, structures_on_analysing[key], report
+        
+        # analyse the uncached ones, largest first
+        semaphore = asyncio.Semaphore(self.pool_size)
+        
+        async def _job(module: Tuple[dict, str, Tuple[List[str], List[str]]]):
+            async with semaphore:
+                for attempt in range(self.retries + 1):
+                    try:
+                        return module[1], await self._analyse_single_async(*module)
+                    except (STAException, asyncio.TimeoutError) as e:
+                        print(f"[ERROR] job {module[1]} failed (attempt {attempt + 1} / {self.retries + 1}): {type(e).__name__}: {e}")
+                raise STAException(f"STA job {module[1]} failed")
+        
+        modules_to_analyse.sort(key = VivadoSTA._module_size, reverse = True)
+        tasks = [asyncio.create_task(_job(module)) for module in modules_to_analyse] # created in order, so the semaphore admits the largest first
+        try:
+            for done, future in enumerate(asyncio.as_completed(tasks)):
+                key, report = await future
+                self._assign_timing(s, root_runtime_id, structures_on_analysing[key], report)
+                print(f"[INFO] {done + 1} / {len(tasks)} STA job(s) finished (hash: {key})")
+                yield key, structures_on_analysing[key], report
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions = True)
         
         print(f"[INFO] static timing analysis finished")
 
 
+class EstimatedSTA(StaticTimingAnalyser):
+    """
+        Analytical timing estimator, w/o Vivado. Save the estimated delay into timing_info[("_simple_in", "_simple_out")] like VivadoSTA.
+        The delay of an operator is linear in the features of its critical path (see features()):
+            `lut`: LUT levels, `carry`: CARRY4 stages, `dsp`: DSP48 stages, `net`: nets between them.
+        The coefficients (ns per feature) default to rough values of 7-series after synthesis,
+            and can be fitted to the reports cached by a VivadoSTA (see calibrate()).
+    """
+    FEATURES = ["lut", "net", "carry", "dsp"]
+    DEFAULT_COEFFICIENTS = {"lut": 0.124, "net": 0.9, "carry": 0.114, "dsp": 2.8}
+    
+    def __init__(self, coefficients: Dict[str, float] = None):
+        self.coefficients: Dict[str, float] = dict(EstimatedSTA.DEFAULT_COEFFICIENTS)
+        if coefficients is not None:
+            self.coefficients.update(coefficients)
+    
+    @staticmethod
+    def _lut_levels(n_inputs: int) -> int:
+        """
+            Depth of a LUT6 tree over `n_inputs` inputs.
+        """
+        levels, capacity = 1, 6
+        while capacity < n_inputs:
+            levels, capacity = levels + 1, capacity * 6
+        return levels if n_inputs > 0 else 0
+    
+    @staticmethod
+    def _custom_vhdl_features(arch_body: str, in_widths: List[int], out_widths: List[int]) -> Dict[str, int]:
+        """
+            Rough features of a CustomVHDLOperator from its VHDL statements:
+                wiring (slicing, concatenation, constant shifts, constants) takes nothing, `*` takes DSPs, `+`/`-` on numbers take a carry chain,
+                ordering comparisons in conditions take a carry chain, and conditions (when / if) or logic operators take a LUT level each.
+        """
+        body = re.sub(r"--[^\n]*", "", arch_body).lower()
+        body = re.sub(r"\"[01]*\"|'[01]'", "", body) # literals
+        W = max(in_widths + out_widths, default = 0)
+        res = {"lut": 0, "carry": 0, "dsp": 0}
+        
+        if "*" in body:
+            a, b = (sorted(in_widths, reverse = True) + [0, 0])[:2]
+            res["dsp"] = math.ceil(a / 25) + math.ceil(b / 18) - 1 # 25 x 18 partial products, summed along the cascades
+        if re.search(r"(signed|unsigned)\s*\([^;]*\)\s*[+-]|[+-]\s*(to_)?(signed|unsigned)\b|[+-]\s*signed\s*\(", body):
+            res["carry"] = math.ceil(W / 4)
+        conditions = re.findall(r"\b(?:when|if|elsif)\b(.*?)(?:\belse\b|\bthen\b|;)", body, flags = re.S)
+        if conditions:
+            res["lut"] += 1
+            if res["carry"] == 0 and any(re.search(r"[<>]", condition) for condition in conditions):
+                res["carry"] = math.ceil(W / 8) # two bits per carry bit
+        if re.search(r"\b(and|or|xor|nand|nor|xnor|not|abs)\b", body):
+            res["lut"] += 1
+        if res["carry"] > 0:
+            res["lut"] += 1 # the propagate / generate LUTs
+        return res
+    
+    def features(self, subs: Structure, runtime_id: RuntimeId) -> Dict[str, int]:
+        """
+            Features of the critical path of the operator `subs` (with its runtime types of `runtime_id`), or None if it has no input or no output.
+            Operators are recognized by the class of their generation method, and others are treated as a LUT tree over all the input bits.
+        """
+        in_widths = [node.get_type(runtime_id).W or 0 for _, node in subs.ports_inside_flipped.nodes(filter = "in", flipped = True)]
+        out_widths = [node.get_type(runtime_id).W or 0 for _, node in subs.ports_inside_flipped.nodes(filter = "out", flipped = True)]
+        if len(in_widths) == 0 or len(out_widths) == 0:
+            return None
+        
+        operator = getattr(subs.custom_generation, "__qualname__", "").split(".")[0]
+        W = max(in_widths)
+        if operator in ("BitsAdd", "BitsSubtract", "BitsSignedInverse"):
+            res = {"lut": 1, "carry": math.ceil(W / 4), "dsp": 0}
+        elif operator == "BitsSignedAbsolute":
+            res = {"lut": 2, "carry": math.ceil(W / 4), "dsp": 0}
+        elif operator in ("BitsUnsignedLessThan", "BitsSignedLessThan"):
+            res = {"lut": 1, "carry": math.ceil(W / 8), "dsp": 0} # two bits per carry bit
+        elif operator == "BitsEqualTo":
+            res = {"lut": EstimatedSTA._lut_levels(2 * W), "carry": 0, "dsp": 0}
+        elif operator in ("BitsNot", "BitsAnd", "BitsOr", "BinaryMultiplexer"):
+            res = {"lut": 1, "carry": 0, "dsp": 0}
+        elif operator in ("BitsReductionAnd", "BitsReductionOr"):
+            res = {"lut": EstimatedSTA._lut_levels(W), "carry": 0, "dsp": 0}
+        elif operator == "CustomVHDLOperator":
+            res = EstimatedSTA._custom_vhdl_features(subs.custom_params.get("arch_body", ""), in_widths, out_widths)
+        else:
+            res = {"lut": EstimatedSTA._lut_levels(sum(in_widths)), "carry": 0, "dsp": 0}
+        
+        res["net"] = max(res["lut"] + (1 if res["carry"] > 0 else 0) + res["dsp"] - 1, 0) # the carry chain itself is dedicated routing
+        return res
+    
+    def estimate(self, features: Dict[str, int]) -> float:
+        return sum(self.coefficients[key] * features[key] for key in EstimatedSTA.FEATURES)
+    
+    def analyse(self, s: Structure, root_runtime_id: RuntimeId):
+        assert s.is_flattened
+        
+        count = 0
+        for subs_inst_name, subs in s.substructures.items():
+            runtime_id = root_runtime_id.next(subs_inst_name)
+            features = self.features(subs, runtime_id)
+            if features is None:
+                continue
+            subs.get_runtime(runtime_id).timing_info[("_simple_in", "_simple_out")] = self.estimate(features)
+            count += 1
+        
+        print(f"[INFO] timing of {count} substructure(s) estimated")
+    
+    def calibrate(self, s: Structure, root_runtime_id: RuntimeId, vivado_sta: VivadoSTA) -> int:
+        """
+            Fit the coefficients to the reports cached in the database of `vivado_sta` for the substructures of `s` (flattened),
+                i.e. the ones it has analysed before. Vivado is not run.
+            Non-negative least squares (features with negative coefficients are dropped and the rest refitted);
+                the coefficients of the features never seen keep their values.
+            Return the number of samples (unique modules) used.
+        """
+        assert s.is_flattened
+        
+        X, y, keys, structure_keys = [], [], set(), set()
+        for subs_inst_name, subs in s.substructures.items():
+            runtime_id = root_runtime_id.next(subs_inst_name)
+            structure_key = VivadoSTA.structure_key(subs, runtime_id)
+            if structure_key in structure_keys:
+                continue
+            structure_keys.add(structure_key)
+            features = self.features(subs, runtime_id)
+            if features is None:
+                continue
+            _, key = vivado_sta._module_vhdl(subs, runtime_id)
+            if key in keys:
+                continue
+            keys.add(key)
+            report = vivado_sta.load_cached_report(key)
+            if report is None:
+                continue
+            X.append([features[feature] for feature in EstimatedSTA.FEATURES])
+            y.append(VivadoSTA.report_delay(report))
+        if len(X) == 0:
+            return 0
+        X, y = np.array(X, dtype = np.float64), np.array(y, dtype = np.float64)
+        
+        seen = [j for j in range(len(EstimatedSTA.FEATURES)) if X[:, j].any()]
+        active, coefficients = list(seen), {}
+        while active:
+            solution = np.linalg.lstsq(X[:, active], y, rcond = None)[0]
+            if (solution >= 0).all():
+                coefficients = dict(zip(active, solution.tolist()))
+                break
+            active = [j for j, c in zip(active, solution) if c > 0]
+        for j in seen:
+            self.coefficients[EstimatedSTA.FEATURES[j]] = coefficients.get(j, 0.0)
+        
+        print(f"[INFO] calibrated with {len(X)} module(s): {self.coefficients}")
+        return len(X)
+
+
+class DelayLibrary:
+    """
+        Characterized delays of operator families on a part, {family: {width: delay}}, saved as JSON.
+        The family of an operator is its class (e.g. "BitsAdd"), or its unique name with the numbers abstracted for a CustomVHDLOperator
+            (e.g. "BitsSignedDivide_Bits_#_Bits_#_DivisionCell"), and its width is the widest input; see family() and width().
+            A CustomVHDLOperator named by hash (see UniqueNamingTemplates.args_kwargs_sha256_16()) is identified by its VHDL instead.
+        Run characterize() to fill it by VivadoSTA, and lookup() interpolates the delays for the widths not characterized.
+    """
+    @staticmethod
+    def default_generators() -> Dict[str, callable]:
+        """
+            Generators (width -> structure) of the standard operators in basic_arch, for characterize().
+        """
+        return {
+            "add": lambda W: BitsAdd(UInt[W], UInt[W]),
+            "subtract": lambda W: BitsSubtract(UInt[W], UInt[W]),
+            "unsigned_less_than": lambda W: BitsUnsignedLessThan(UInt[W], UInt[W]),
+            "signed_less_than": lambda W: BitsSignedLessThan(SInt[W], SInt[W]),
+            "equal_to": lambda W: BitsEqualTo(Bits[W], Bits[W]),
+            "multiplexer": lambda W: BinaryMultiplexer(Bits[W]),
+            "multiply": lambda W: FixedPointMultiplyVHDL(SFixedPoint[W - W // 2, W // 2]),
+            "unsigned_multiply": lambda W: BitsUnsignedMultiply(Bits[W], Bits[W]),
+            "divide": lambda W: FixedPointDivide(SFixedPoint[W - W // 2, W // 2])
+        }
+    
+    def __init__(self, part_name: str = None, delays: Dict[str, Dict[int, float]] = None):
+        self.part_name = part_name
+        self.delays: Dict[str, Dict[int, float]] = delays if delays is not None else {}
+    
+    @staticmethod
+    def family(subs: Structure) -> str:
+        operator = getattr(subs.custom_generation, "__qualname__", "").split(".")[0]
+        if operator != "CustomVHDLOperator":
+            return operator
+        if re.search(r"_[0-9a-f]{16}(?=_|$)", subs.unique_name) is None:
+            return re.sub(r"\d+", "#", subs.unique_name)
+        
+        # hashed name, differs per width, so the ports and the VHDL with the numbers abstracted are hashed instead
+        content = re.sub(r"\d+", "#", str((VivadoSTA.module_ports(subs), subs.custom_params.get("arch_body"), subs.custom_params.get("arch_decl"))))
+        return f"{operator}_{hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]}"
+    
+    @staticmethod
+    def width(subs: Structure, runtime_id: RuntimeId) -> int:
+        """
+            The widest input of `subs`, or None if it has no input or no output.
+        """
+        in_widths = [node.get_type(runtime_id).W or 0 for _, node in subs.ports_inside_flipped.nodes(filter = "in", flipped = True)]
+        if len(in_widths) == 0 or len(subs.ports_inside_flipped.nodes(filter = "out", flipped = True)) == 0:
+            return None
+        return max(in_widths)
+    
+    def add(self, family: str, width: int, delay: float):
+        widths = self.delays.setdefault(family, {})
+        widths[width] = max(widths.get(width, 0.0), delay) # e.g. parts of the same family in a composite operator
+    
+    def lookup(self, family: str, width: int) -> float:
+        """
+            Delay of `family` at `width`, piecewise linear between the characterized widths and extrapolated by the nearest two outside;
+                None if the family is not characterized.
+        """
+        widths = self.delays.get(family)
+        if not widths:
+            return None
+        if width in widths:
+            return widths[width]
+        
+        xs = sorted(widths.keys())
+        ys = [widths[x] for x in xs]
+        if len(xs) == 1:
+            return ys[0]
+        if width < xs[0]:
+            (x0, y0), (x1, y1) = (xs[0], ys[0]), (xs[1], ys[1])
+        elif width > xs[-1]:
+            (x0, y0), (x1, y1) = (xs[-2], ys[-2]), (xs[-1], ys[-1])
+        else:
+            return float(np.interp(width, xs, ys))
+        return max(y0 + (y1 - y0) * (width - x0) / (x1 - x0), 0.0)
+    
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok = True)
+        with open(path, "w") as f:
+            json.dump({"part_name": self.part_name, "delays": {family: {str(W): d for W, d in sorted(widths.items())} for family, widths in self.delays.items()}}, f, indent = 4)
+    
+    @staticmethod
+    def load(path: str) -> 'DelayLibrary':
+        with open(path, "r") as f:
+            content = json.load(f)
+        return DelayLibrary(content["part_name"], {family: {int(W): d for W, d in widths.items()} for family, widths in content["delays"].items()})
+    
+    def characterize(self, vivado_sta: VivadoSTA, widths: List[int], generators: Dict[str, callable] = None):
+        """
+            Synthesize the operators built by `generators` (see default_generators()) at each of `widths` by `vivado_sta`,
+                and record the delays of all their (flattened) parts.
+            All the instances are put into one structure, so that the unique modules are analysed in the pool of `vivado_sta` together;
+                modules analysed before are read from its database (see TimingDatabase), keyed by part, tool version and options.
+        """
+        if self.part_name is None:
+            self.part_name = vivado_sta.part_name
+        elif self.part_name != vivado_sta.part_name:
+            raise STAException(f"The library is for {self.part_name} rather than {vivado_sta.part_name}")
+        generators = generators if generators is not None else DelayLibrary.default_generators()
+        
+        s = Structure()
+        for name, generator in generators.items():
+            for W in widths:
+                op = generator(W)
+                inst = s.add_substructure(f"{name}_{W}", op)
+                for port_name, port in op.ports_inside_flipped.nodes(flipped = True):
+                    outer = s.add_port(f"{name}_{W}_{port_name}", Input[port.origin_signal_type.io_clear()] if port.is_driver else Output[Auto])
+                    s.connect(outer, inst.IO.access(port_name))
+        
+        rid = RuntimeId.create()
+        s.deduction(rid)
+        s.expand()
+        s.deduction(rid)
+        
+        vivado_sta.analyse(s, rid)
+        
+        for subs_inst_name, subs in s.substructures.items():
+            runtime_id = rid.next(subs_inst_name)
+            W = DelayLibrary.width(subs, runtime_id)
+            delay = subs.get_runtime(runtime_id).timing_info.get(("_simple_in", "_simple_out"))
+            if W is not None and delay is not None:
+                self.add(DelayLibrary.family(subs), W, delay)
+        
+        print(f"[INFO] {sum(len(widths) for widths in self.delays.values())} delay(s) of {len(self.delays)} operator family(ies) characterized for {self.part_name}")
+
+
+class LibrarySTA(StaticTimingAnalyser):
+    """
+        Static timing analyser by a characterized DelayLibrary, w/o synthesis.
+        Operators of the families not in the library are estimated by `fallback` (an EstimatedSTA), or left without timing info if it is None.
+    """
+    def __init__(self, library: DelayLibrary, fallback: EstimatedSTA = None):
+        self.library = library
+        self.fallback = fallback
+    
+    def analyse(self, s: Structure, root_runtime_id: RuntimeId):
+        assert s.is_flattened
+        
+        hits, misses = 0, set()
+        for subs_inst_name, subs in s.substructures.items():
+            runtime_id = root_runtime_id.next(subs_inst_name)
+            W = DelayLibrary.width(subs, runtime_id)
+            if W is None:
+                continue
+            
+            family = DelayLibrary.family(subs)
+            delay = self.library.lookup(family, W)
+            if delay is not None:
+                hits += 1
+            else:
+                misses.add(family)
+                features = self.fallback.features(subs, runtime_id) if self.fallback is not None else None
+                if features is None:
+                    continue
+                delay = self.fallback.estimate(features)
+            subs.get_runtime(runtime_id).timing_info[("_simple_in", "_simple_out")] = delay
+        
+        print(f"[INFO] timing of {hits} substructure(s) found in the library, {len(misses)} family(ies) not characterized") # TODO
+
+
 import sys
 _current_module = sys.modules[__name__]
 __all__ = [name for name in dir() if not name.startswith('_') and getattr(getattr(_current_module, name, None), "__module__", None) == __name__]